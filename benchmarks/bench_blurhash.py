@@ -0,0 +1,58 @@
+"""
+Compares blurhash placeholder generation from the full 512px image variant (the
+previous approach) against the 32px downsample used by src.images.
+
+    python -m benchmarks.bench_blurhash [--runs N]
+"""
+
+import argparse
+import io
+import os
+import time
+
+os.environ.setdefault("AWS_ACCESS_KEY", "benchmark")
+os.environ.setdefault("AWS_SECRET_KEY", "benchmark")
+
+import blurhash  # noqa: E402
+from PIL import Image  # noqa: E402
+
+from src.images import blurhash_placeholder  # noqa: E402
+
+
+def synthetic_image(size: int = 512) -> Image.Image:
+    """A photo-like test image: smooth gradients with some noise."""
+    gradient = Image.linear_gradient("L").resize((size, size))
+    noise = Image.effect_noise((size, size), 40)
+    return Image.merge("RGB", (gradient, noise, gradient.rotate(90)))
+
+
+def full_size_placeholder(image: Image.Image) -> str:
+    image_file = io.BytesIO()
+    image.save(image_file, format="JPEG")
+    image_file.seek(0)
+    return blurhash.encode(image_file, 4, 3)
+
+
+def time_per_call(function, image, runs: int) -> float:
+    start = time.perf_counter()
+    for _ in range(runs):
+        function(image)
+    return (time.perf_counter() - start) / runs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    image = synthetic_image()
+    full = time_per_call(full_size_placeholder, image, args.runs)
+    sampled = time_per_call(blurhash_placeholder, image, args.runs)
+
+    print(f"full 512px image:  {full * 1000:8.2f} ms/image")
+    print(f"32px downsample:   {sampled * 1000:8.2f} ms/image")
+    print(f"speedup:           {full / sampled:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Compares the CPU cost of serializing an item list the previous way (ItemExport
+models revalidated against the response_model, jsonable_encoder, stdlib json)
+against the direct path used now (plain dicts encoded with orjson), and shows
+what gzip costs and saves on the same body.
+
+    python -m benchmarks.bench_json [--items N] [--runs N]
+"""
+
+import argparse
+import json
+import os
+import random
+import time
+from types import SimpleNamespace
+
+os.environ.setdefault("AWS_ACCESS_KEY", "benchmark")
+os.environ.setdefault("AWS_SECRET_KEY", "benchmark")
+
+import orjson  # noqa: E402
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+
+from src.compression import gzip_body  # noqa: E402
+from src.models import BidExport, ItemExport, ItemList  # noqa: E402
+from src.queries import item_export_dict  # noqa: E402
+
+
+def synthetic_rows(count: int):
+    """Rows shaped like the results of item_export_query()."""
+    rng = random.Random(0)
+    rows = []
+    for index in range(count):
+        digest = f"{rng.getrandbits(128):032x}"
+        base_url = f"https://bucket.s3.us-east-1.amazonaws.com/images/{digest}"
+        rows.append(
+            SimpleNamespace(
+                name=f"Item {index:04d}",
+                description="A donated lot for the silent auction. " * 4,
+                original_bid=float(rng.randint(5, 200)),
+                tags=rng.sample(["art", "sports", "travel", "dining", "kids"], 2),
+                image=f"{base_url}/512.jpeg",
+                image_placeholder="LEHV6nWB2yk8pyo0adR*.7kCMdnj",
+                image_variants=[
+                    {
+                        "url": f"{base_url}/{size}.{fmt}",
+                        "format": fmt,
+                        "width": size,
+                        "height": size,
+                    }
+                    for size in (256, 512, 1024)
+                    for fmt in ("webp", "jpeg")
+                ],
+                winning_bid=float(rng.randint(200, 900)) if rng.random() < 0.7 else None,
+                winning_email="bidder@example.com",
+            )
+        )
+    return rows
+
+
+def model_path(rows) -> bytes:
+    """What a response_model route did: build models, revalidate, encode, json.dumps."""
+    items = [
+        ItemExport(
+            name=row.name,
+            description=row.description,
+            original_bid=row.original_bid,
+            tags=row.tags,
+            image=row.image,
+            image_placeholder=row.image_placeholder,
+            image_variants=row.image_variants or [],
+            winning_bid=BidExport(bid=row.winning_bid)
+            if row.winning_bid is not None
+            else None,
+        )
+        for row in rows
+    ]
+    validated = ItemList.validate(ItemList(items=items))
+    return json.dumps(
+        jsonable_encoder(validated),
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":"),
+    ).encode()
+
+
+def direct_path(rows) -> bytes:
+    return orjson.dumps(
+        {"items": [item_export_dict(row) for row in rows], "next_cursor": None}
+    )
+
+
+def time_per_call(function, argument, runs: int) -> float:
+    start = time.perf_counter()
+    for _ in range(runs):
+        function(argument)
+    return (time.perf_counter() - start) / runs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--items", type=int, default=200)
+    parser.add_argument("--runs", type=int, default=200)
+    args = parser.parse_args()
+
+    rows = synthetic_rows(args.items)
+    if json.loads(model_path(rows)) != json.loads(direct_path(rows)):
+        raise SystemExit("The two paths produce different documents")
+
+    model = time_per_call(model_path, rows, args.runs)
+    direct = time_per_call(direct_path, rows, args.runs)
+    body = direct_path(rows)
+    compress = time_per_call(gzip_body, body, args.runs)
+    compressed = len(gzip_body(body))
+
+    print(f"{args.items} items, {len(body) / 1024:.1f} KiB of JSON")
+    print(f"response_model + json: {model * 1000:8.3f} ms/request")
+    print(f"dicts + orjson:        {direct * 1000:8.3f} ms/request")
+    print(
+        f"CPU saved:             {(model - direct) * 1000:8.3f} ms/request "
+        f"({model / direct:.1f}x)"
+    )
+    print(
+        f"gzip:                  {compress * 1000:8.3f} ms/body, "
+        f"{compressed / 1024:.1f} KiB ({compressed / len(body):.0%} of original)"
+    )
+
+
+if __name__ == "__main__":
+    main()
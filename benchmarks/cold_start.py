@@ -0,0 +1,67 @@
+"""
+Measures how long a freshly started worker takes to serve its first request: the
+time from launching uvicorn to the first 200 from GET /, which covers the imports
+and every startup handler. The database configured by DATABASE_URL must already
+be migrated.
+
+    python -m benchmarks.cold_start [--runs N]
+"""
+
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def cold_start(timeout: float) -> float:
+    port = free_port()
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "src.main:app", "--port", str(port)],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        env=os.environ,
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            if server.poll() is not None:
+                raise RuntimeError(f"The server exited with status [{server.returncode}]")
+            try:
+                if httpx.get(f"http://127.0.0.1:{port}/", timeout=1).status_code == 200:
+                    return time.perf_counter() - start
+            except httpx.TransportError:
+                pass
+            time.sleep(0.005)
+        raise RuntimeError(f"The server did not answer within [{timeout}] seconds")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    args = parser.parse_args()
+
+    samples = [cold_start(args.timeout) for _ in range(args.runs)]
+    print(
+        f"first response after {statistics.median(samples) * 1000:.0f} ms median "
+        f"(min {min(samples) * 1000:.0f} ms, max {max(samples) * 1000:.0f} ms, "
+        f"{args.runs} runs)"
+    )
+
+
+if __name__ == "__main__":
+    main()
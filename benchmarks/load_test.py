@@ -0,0 +1,598 @@
+"""
+Load test simulating the close of an auction, against the real app and database.
+
+Seeds synthetic users, items and bids into the database configured by
+DATABASE_URL, then replays three phases:
+
+    login     a burst of concurrent logins
+    catalog   clients polling /items/items with If-None-Match
+    frenzy    bidders hammering a few hot items while the catalog is polled
+
+and finally checks that the bids in the database are consistent: each item has a
+single winner holding its highest bid, and every accepted bid respects
+minimum_bid_increment. The report is written as JSON so runs can be compared
+between versions.
+
+    python -m benchmarks.load_test [--url http://localhost:8000] [--output report.json]
+
+Without --url the app from src.main is driven in-process through httpx's ASGI
+transport. Seeded rows are prefixed with a run id so they never collide with
+existing data; pass --cleanup to delete them afterwards. The run turns bidding on
+for the whole auction through a temporary admin account, and always restores the
+previous setting and deletes that account when it ends, so don't point it at an
+auction that is live. Requires httpx.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import sys
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+os.environ.setdefault("AWS_ACCESS_KEY", "benchmark")
+os.environ.setdefault("AWS_SECRET_KEY", "benchmark")
+
+import httpx  # noqa: E402
+from sqlalchemy import bindparam, text  # noqa: E402
+
+from src.catalog import ITEM_CHANNEL  # noqa: E402
+from src.database import get_engine  # noqa: E402
+from src.models import BidInternal, ItemInternal, UserInternal  # noqa: E402
+from src.migrations import upgrade_database  # noqa: E402
+from src.notifications import notify_clause  # noqa: E402
+from src.passwords import password_context  # noqa: E402
+from src.settings import settings  # noqa: E402
+
+PASSWORD = "benchmark-password"
+FLOAT_TOLERANCE = 1e-6
+
+SEED_SUMMARY_STATEMENTS = [
+    """
+    INSERT INTO item_bid_stats (item_name, bids, bidders, winning_bid)
+    SELECT b.item_name, count(*), count(DISTINCT b.email), max(b.bid)
+    FROM bids b WHERE b.item_name LIKE :pattern
+    GROUP BY b.item_name
+    """,
+    """
+    INSERT INTO item_bid_minutes (item_name, minute, bids)
+    SELECT item_name, floor(extract(epoch FROM time_placed) / 60)::bigint, count(*)
+    FROM bids WHERE item_name LIKE :pattern
+    GROUP BY 1, 2
+    """,
+    """
+    INSERT INTO bidders (email)
+    SELECT DISTINCT email FROM bids WHERE item_name LIKE :pattern
+    ON CONFLICT DO NOTHING
+    """,
+]
+
+
+class Recorder:
+    """Collects request latencies and status codes, per phase and endpoint."""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[str, Dict[int, int]] = defaultdict(lambda: defaultdict(int))
+
+    async def request(self, client, endpoint: str, method: str, url: str, **kwargs):
+        start = time.perf_counter()
+        response = await client.request(method, url, **kwargs)
+        self.samples[endpoint].append(time.perf_counter() - start)
+        self.statuses[endpoint][response.status_code] += 1
+        return response
+
+    def summary(self, duration: float) -> dict:
+        total = sum(len(samples) for samples in self.samples.values())
+        return {
+            "requests": total,
+            "duration_seconds": round(duration, 3),
+            "throughput_rps": round(total / duration, 2) if duration else 0.0,
+            "endpoints": {
+                endpoint: latency_summary(samples, self.statuses[endpoint])
+                for endpoint, samples in sorted(self.samples.items())
+            },
+        }
+
+
+def percentile(sorted_samples: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_samples:
+        return 0.0
+    rank = math.ceil(fraction * len(sorted_samples)) - 1
+    return sorted_samples[max(0, min(len(sorted_samples) - 1, rank))]
+
+
+def latency_summary(samples: List[float], statuses: Dict[int, int]) -> dict:
+    ordered = sorted(samples)
+    return {
+        "count": len(ordered),
+        "statuses": {str(status): count for status, count in sorted(statuses.items())},
+        "p50_ms": round(percentile(ordered, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(ordered, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(ordered, 0.99) * 1000, 2),
+        "max_ms": round(ordered[-1] * 1000, 2) if ordered else 0.0,
+    }
+
+
+async def run_phase(jobs, concurrency: int) -> float:
+    """Runs the job coroutine factories on `concurrency` workers, returning the wall time."""
+    queue = list(reversed(jobs))
+
+    async def worker():
+        while queue:
+            await queue.pop()()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return time.perf_counter() - start
+
+
+# ----- ----- ----- ----- -----
+# Seeding
+# ----- ----- ----- ----- -----
+
+
+def seed(run_id: str, args, rng: random.Random) -> dict:
+    """Inserts this run's users, items and bid history, returning their keys."""
+    prefix = f"bench-{run_id}"
+    hashed_password = password_context.hash(PASSWORD)
+    users = [f"{prefix}-user-{index:05d}@example.com" for index in range(args.users)]
+    admin = f"{prefix}-admin@example.com"
+    items = [f"{prefix}-item-{index:05d}" for index in range(args.items)]
+    delta = settings.minimum_bid_increment
+
+    user_rows = [
+        {
+            "email": email,
+            "first_name": "Bench",
+            "last_name": f"User {index}",
+            "hashed_password": hashed_password,
+            "enabled": True,
+            "admin": email == admin,
+            "token_version": 0,
+        }
+        for index, email in enumerate(users + [admin])
+    ]
+    item_rows = [
+        {
+            "name": name,
+            "description": f"Synthetic lot {index} for load testing",
+            "original_bid": float(rng.randint(5, 200)),
+            "tags": [rng.choice(["art", "sports", "travel", "dining", "kids"])],
+            "image": "",
+            "image_placeholder": "",
+        }
+        for index, name in enumerate(items)
+    ]
+
+    bid_rows = []
+    winners = []
+    placed = datetime.now(timezone.utc) - timedelta(hours=1)
+    for item in item_rows:
+        amount = item["original_bid"]
+        count = rng.randint(0, 2 * args.seed_bids // max(1, args.items))
+        for index in range(count):
+            if index:
+                amount = round(amount + delta * rng.choice([1, 1.5, 2, 3]), 2)
+            placed += timedelta(milliseconds=10)
+            bid_rows.append(
+                {
+                    "id": str(uuid.uuid4()),
+                    "bid": amount,
+                    "email": rng.choice(users),
+                    "time_placed": placed,
+                    "item_name": item["name"],
+                }
+            )
+        if count:
+            winners.append({"item_name": item["name"], "bid_id": bid_rows[-1]["id"]})
+
+    engine = get_engine()
+    with engine.begin() as connection:
+        connection.execute(UserInternal.__table__.insert(), user_rows)
+        connection.execute(ItemInternal.__table__.insert(), item_rows)
+        if bid_rows:
+            connection.execute(BidInternal.__table__.insert(), bid_rows)
+            # The bid statement keeps the analytics summaries; direct inserts don't.
+            for statement in SEED_SUMMARY_STATEMENTS:
+                connection.execute(text(statement), {"pattern": f"{prefix}-%"})
+        if winners:
+            items_table = ItemInternal.__table__
+            connection.execute(
+                items_table.update()
+                .where(items_table.c.name == bindparam("item_name"))
+                .values(winning_bid_id=bindparam("bid_id")),
+                winners,
+            )
+        # Running servers cache the catalog; tell them it changed.
+        connection.execute(notify_clause(ITEM_CHANNEL, "*"))
+
+    return {
+        "prefix": prefix,
+        "users": users,
+        "admin": admin,
+        "items": items,
+        "hot_items": items[: args.hot_items],
+        "seed_bids": len(bid_rows),
+    }
+
+
+def cleanup(prefix: str) -> None:
+    with get_engine().begin() as connection:
+        pattern = {"pattern": f"{prefix}-%"}
+        connection.execute(
+            text("UPDATE items SET winning_bid_id = NULL WHERE name LIKE :pattern"), pattern
+        )
+        connection.execute(text("DELETE FROM bids WHERE item_name LIKE :pattern"), pattern)
+        connection.execute(text("DELETE FROM items WHERE name LIKE :pattern"), pattern)
+        connection.execute(text("DELETE FROM users WHERE email LIKE :pattern"), pattern)
+        connection.execute(text("DELETE FROM bidders WHERE email LIKE :pattern"), pattern)
+        connection.execute(notify_clause(ITEM_CHANNEL, "*"))
+
+
+def delete_user(email: str) -> None:
+    with get_engine().begin() as connection:
+        connection.execute(text("DELETE FROM users WHERE email = :email"), {"email": email})
+
+
+async def set_bidding(client, token: str, enabled: bool) -> None:
+    response = await client.post(
+        "/bids/enabled",
+        json={"enabled": enabled},
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    response.raise_for_status()
+
+
+# ----- ----- ----- ----- -----
+# Traffic
+# ----- ----- ----- ----- -----
+
+
+async def login(client, recorder: Recorder, email: str, tokens: Dict[str, str]) -> None:
+    response = await recorder.request(
+        client,
+        "POST /auth/token",
+        "POST",
+        "/auth/token",
+        data={"username": email, "password": PASSWORD},
+    )
+    if response.status_code == 200:
+        tokens[email] = response.json()["access_token"]
+
+
+async def poll_catalog(
+    client, recorder: Recorder, etags: List[Optional[str]], poller: int, polls: int
+):
+    """Polls like one client would: one request at a time, revalidating its last ETag."""
+    for _ in range(polls):
+        headers = {"If-None-Match": etags[poller]} if etags[poller] else {}
+        response = await recorder.request(
+            client, "GET /items/items", "GET", "/items/items", headers=headers
+        )
+        etags[poller] = response.headers.get("ETag", etags[poller])
+
+
+async def place_bid(client, recorder: Recorder, token: str, item_name: str, rng, accepted):
+    response = await recorder.request(
+        client, "GET /items/item", "GET", "/items/item", params={"item_name": item_name}
+    )
+    if response.status_code != 200:
+        return
+    item = response.json()
+    winning_bid = item.get("winning_bid")
+    delta = settings.minimum_bid_increment
+    if winning_bid is None:
+        amount = item["original_bid"]
+    elif rng.random() < 0.1:
+        # Deliberately too small, to exercise the rejection path.
+        amount = round(winning_bid["bid"] + delta / 2, 2)
+    else:
+        amount = round(winning_bid["bid"] + delta * rng.choice([1, 1, 1.5, 2, 3]), 2)
+
+    response = await recorder.request(
+        client,
+        "POST /bids/bid",
+        "POST",
+        "/bids/bid",
+        json={"item_name": item_name, "bid": amount},
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    if response.status_code == 200:
+        accepted[item_name] += 1
+
+
+# ----- ----- ----- ----- -----
+# Correctness
+# ----- ----- ----- ----- -----
+
+
+def check_correctness(prefix: str, seed_bids: int, accepted: Dict[str, int]) -> dict:
+    """
+    Verifies winners, increments and the analytics summaries for every item seeded by
+    this run.
+    """
+    delta = settings.minimum_bid_increment
+    violations = []
+    pattern = {"pattern": f"{prefix}-%"}
+
+    with get_engine().connect() as connection:
+        items = connection.execute(
+            text(
+                "SELECT i.name, i.original_bid, i.winning_bid_id, b.bid, b.item_name "
+                "FROM items i LEFT JOIN bids b ON b.id = i.winning_bid_id "
+                "WHERE i.name LIKE :pattern"
+            ),
+            pattern,
+        ).all()
+        bids = defaultdict(list)
+        bidders = defaultdict(set)
+        for row in connection.execute(
+            text(
+                "SELECT item_name, bid, email FROM bids "
+                "WHERE item_name LIKE :pattern ORDER BY bid"
+            ),
+            pattern,
+        ):
+            bids[row.item_name].append(row.bid)
+            bidders[row.item_name].add(row.email)
+        summaries = {
+            row.item_name: row
+            for row in connection.execute(
+                text(
+                    "SELECT item_name, bids, bidders, winning_bid FROM item_bid_stats "
+                    "WHERE item_name LIKE :pattern"
+                ),
+                pattern,
+            )
+        }
+
+    for item in items:
+        amounts = bids.get(item.name, [])
+        summary = summaries.get(item.name)
+        if amounts and (
+            summary is None
+            or summary.bids != len(amounts)
+            or summary.bidders != len(bidders[item.name])
+            or abs(summary.winning_bid - amounts[-1]) > FLOAT_TOLERANCE
+        ):
+            violations.append(
+                {
+                    "item": item.name,
+                    "error": "analytics summary does not match the bids",
+                    "summary": dict(summary._mapping) if summary else None,
+                    "bids": len(amounts),
+                    "bidders": len(bidders[item.name]),
+                    "highest": amounts[-1],
+                }
+            )
+        if not amounts:
+            if item.winning_bid_id is not None:
+                violations.append({"item": item.name, "error": "winner without bids"})
+            continue
+        if item.winning_bid_id is None or item.item_name != item.name:
+            violations.append({"item": item.name, "error": "bids without a valid winner"})
+            continue
+        highest = amounts[-1]
+        if abs(item.bid - highest) > FLOAT_TOLERANCE:
+            violations.append(
+                {
+                    "item": item.name,
+                    "error": "winner is not the highest bid",
+                    "winner": item.bid,
+                    "highest": highest,
+                }
+            )
+        if len(amounts) > 1 and abs(amounts[-2] - highest) < FLOAT_TOLERANCE:
+            violations.append(
+                {
+                    "item": item.name,
+                    "error": "two bids share the winning amount",
+                    "amount": highest,
+                }
+            )
+        if amounts[0] < item.original_bid - FLOAT_TOLERANCE:
+            violations.append(
+                {"item": item.name, "error": "bid below starting bid", "amount": amounts[0]}
+            )
+        # Every accepted bid beat the then-highest bid by the increment, so in order of
+        # amount each bid must clear the previous one by at least the increment.
+        for previous, current in zip(amounts, amounts[1:]):
+            if current - previous < delta - FLOAT_TOLERANCE:
+                violations.append(
+                    {
+                        "item": item.name,
+                        "error": "increment not respected",
+                        "previous": previous,
+                        "bid": current,
+                    }
+                )
+
+    stored_bids = sum(len(amounts) for amounts in bids.values())
+    accepted_bids = sum(accepted.values())
+    if stored_bids != seed_bids + accepted_bids:
+        violations.append(
+            {
+                "error": "stored bids do not match accepted bids",
+                "stored": stored_bids,
+                "expected": seed_bids + accepted_bids,
+            }
+        )
+
+    return {
+        "items_checked": len(items),
+        "accepted_bids": accepted_bids,
+        "stored_bids": stored_bids,
+        "violations": violations,
+        "passed": not violations,
+    }
+
+
+# ----- ----- ----- ----- -----
+# Driver
+# ----- ----- ----- ----- -----
+
+
+async def run(args) -> dict:
+    rng = random.Random(args.seed)
+    run_id = uuid.uuid4().hex[:8]
+    started_at = datetime.now(timezone.utc).isoformat()
+
+    upgrade_database()
+    seeded = seed(run_id, args, rng)
+
+    app = None
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=args.timeout)
+    else:
+        from src.main import app
+
+        await app.router.startup()
+        client = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app),
+            base_url="http://benchmark",
+            timeout=args.timeout,
+        )
+
+    phases = {}
+    tokens: Dict[str, str] = {}
+    bidding_was_enabled = None
+    try:
+        await login(client, Recorder(), seeded["admin"], tokens)
+        response = await client.get("/bids/enabled")
+        response.raise_for_status()
+        bidding_was_enabled = response.json()["bidding_enabled"]
+        await set_bidding(client, tokens[seeded["admin"]], True)
+
+        recorder = Recorder()
+        burst = seeded["users"][: args.login_burst]
+        duration = await run_phase(
+            [lambda email=email: login(client, recorder, email, tokens) for email in burst],
+            args.concurrency,
+        )
+        phases["login"] = recorder.summary(duration)
+
+        recorder = Recorder()
+        etags: List[Optional[str]] = [None] * args.poll_clients
+        pollers = [
+            lambda poller=poller: poll_catalog(
+                client, recorder, etags, poller, args.poll_requests
+            )
+            for poller in range(args.poll_clients)
+        ]
+        duration = await run_phase(pollers, min(args.concurrency, args.poll_clients))
+        phases["catalog"] = recorder.summary(duration)
+
+        recorder = Recorder()
+        bidders = [tokens[email] for email in burst if email in tokens][: args.bidders]
+        if not bidders:
+            raise RuntimeError("No bidder could log in")
+        accepted: Dict[str, int] = defaultdict(int)
+        jobs = []
+        for _ in range(args.frenzy_bids):
+            hot = rng.random() < args.hot_fraction
+            item_name = rng.choice(seeded["hot_items"] if hot else seeded["items"])
+            token = rng.choice(bidders)
+            jobs.append(
+                lambda token=token, item_name=item_name: place_bid(
+                    client, recorder, token, item_name, rng, accepted
+                )
+            )
+        # Meanwhile every poller keeps polling, one request at a time.
+        pollers = [
+            lambda poller=poller: poll_catalog(
+                client,
+                recorder,
+                etags,
+                poller,
+                args.frenzy_polls // args.poll_clients
+                + (poller < args.frenzy_polls % args.poll_clients),
+            )
+            for poller in range(args.poll_clients)
+        ]
+        start = time.perf_counter()
+        await asyncio.gather(
+            run_phase(jobs, args.concurrency), run_phase(pollers, args.poll_clients)
+        )
+        duration = time.perf_counter() - start
+        phases["frenzy"] = recorder.summary(duration)
+    finally:
+        try:
+            if bidding_was_enabled is not None:
+                await set_bidding(client, tokens[seeded["admin"]], bidding_was_enabled)
+        finally:
+            await client.aclose()
+            if app is not None:
+                await app.router.shutdown()
+            delete_user(seeded["admin"])
+
+    correctness = check_correctness(seeded["prefix"], seeded["seed_bids"], accepted)
+    if args.cleanup:
+        cleanup(seeded["prefix"])
+
+    return {
+        "run_id": run_id,
+        "target": args.url or "in-process",
+        "started_at": started_at,
+        "config": vars(args),
+        "phases": phases,
+        "correctness": correctness,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--url", help="Base URL of a running server; defaults to in-process")
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--items", type=int, default=200)
+    parser.add_argument("--hot-items", type=int, default=5)
+    parser.add_argument(
+        "--hot-fraction", type=float, default=0.8, help="Share of frenzy bids on hot items"
+    )
+    parser.add_argument(
+        "--seed-bids", type=int, default=2000, help="Approximate bid history to seed"
+    )
+    parser.add_argument("--login-burst", type=int, default=200)
+    parser.add_argument("--poll-clients", type=int, default=50)
+    parser.add_argument(
+        "--poll-requests", type=int, default=20, help="Catalog polls per client"
+    )
+    parser.add_argument("--bidders", type=int, default=100)
+    parser.add_argument("--frenzy-bids", type=int, default=2000)
+    parser.add_argument(
+        "--frenzy-polls", type=int, default=1000, help="Catalog polls during the frenzy, across clients"
+    )
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument(
+        "--timeout", type=float, default=30.0, help="Per-request timeout in seconds"
+    )
+    parser.add_argument(
+        "--seed", type=int, default=0, help="Random seed for the synthetic data and traffic"
+    )
+    parser.add_argument(
+        "--cleanup", action="store_true", help="Delete this run's rows afterwards"
+    )
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    body = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as output:
+            output.write(body + "\n")
+    else:
+        print(body)
+    sys.exit(0 if report["correctness"]["passed"] else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Live auction analytics.
+
+The bid statement in src.bidding keeps per-item summaries (item_bid_stats,
+item_bid_minutes and bidders) in the same transaction as every bid, so the
+analytics are read from those small tables instead of scanning bids: one row per
+item with bids, one per item and minute of the last hour, and one per bidder.
+Summaries of a deleted item are deleted with it. Results are cached for
+ANALYTICS_CACHE_TTL seconds, so however often dashboards refresh, each worker
+reads the summaries at most once per interval.
+"""
+
+import time
+
+from sqlalchemy import func
+from sqlmodel import select
+
+from src.cache import TTLCache
+from src.models import (
+    AnalyticsResponse,
+    Bidder,
+    BidsPerMinute,
+    ContestedItem,
+    ItemBidMinute,
+    ItemBidStats,
+)
+from src.settings import settings
+
+# Minutes of per-minute bid counts reported in the bids-per-minute series.
+BIDS_PER_MINUTE_WINDOW = 60
+
+# `top` -> AnalyticsResponse
+analytics_cache = TTLCache(maxsize=100, ttl=settings.ANALYTICS_CACHE_TTL)
+
+
+async def auction_analytics(session, top: int = 10) -> AnalyticsResponse:
+    """Returns the auction totals and the top most contested items."""
+    cached = analytics_cache.get(top)
+    if cached is not None:
+        return cached
+
+    now_minute = int(time.time() // 60)
+    oldest_minute = now_minute - BIDS_PER_MINUTE_WINDOW + 1
+
+    totals = (
+        await session.execute(
+            select(
+                func.coalesce(func.sum(ItemBidStats.bids), 0).label("bids"),
+                func.coalesce(func.sum(ItemBidStats.winning_bid), 0.0).label("raised"),
+                func.count().label("items"),
+                select(func.count())
+                .select_from(Bidder)
+                .scalar_subquery()
+                .label("bidders"),
+            )
+        )
+    ).one()
+    minutes = dict(
+        (
+            await session.execute(
+                select(ItemBidMinute.minute, func.sum(ItemBidMinute.bids))
+                .where(ItemBidMinute.minute >= oldest_minute)
+                .group_by(ItemBidMinute.minute)
+            )
+        ).all()
+    )
+    contested = (
+        await session.execute(
+            select(ItemBidStats)
+            .order_by(ItemBidStats.bids.desc(), ItemBidStats.item_name)
+            .limit(top)
+        )
+    ).scalars().all()
+
+    analytics = AnalyticsResponse(
+        total_bids=totals.bids,
+        total_raised=totals.raised,
+        unique_bidders=totals.bidders,
+        items_with_bids=totals.items,
+        bids_per_minute=[
+            BidsPerMinute(minute=minute * 60, bids=minutes.get(minute, 0))
+            for minute in range(oldest_minute, now_minute + 1)
+        ],
+        most_contested=[
+            ContestedItem(
+                item_name=item.item_name,
+                bids=item.bids,
+                unique_bidders=item.bidders,
+                winning_bid=item.winning_bid,
+            )
+            for item in contested
+        ],
+    )
+    analytics_cache.set(top, analytics)
+    return analytics
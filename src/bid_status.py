@@ -0,0 +1,138 @@
+"""
+Per-user cache of GET /bids/user results.
+
+A user's winning/losing classification only changes when an item they bid on
+receives a new bid or is edited, so entries are invalidated on exactly those
+events (from any worker, via the bid and item notification channels), with
+BID_STATUS_CACHE_TTL as an upper bound on staleness.
+"""
+
+import json
+import threading
+from collections import defaultdict
+from typing import DefaultDict, Dict, Iterable, Optional, Set
+
+from src.bidding import BID_CHANNEL
+from src.cache import TTLCache
+from src.catalog import ITEM_CHANNEL
+from src.notifications import listener
+from src.settings import settings
+
+
+class BidStatusCache:
+    def __init__(self):
+        self._cache = TTLCache(
+            maxsize=settings.BID_STATUS_CACHE_SIZE, ttl=settings.BID_STATUS_CACHE_TTL
+        )
+        # Item name -> emails whose cached status includes that item. Entries of users
+        # whose status has expired or been evicted are pruned once the watcher count
+        # doubles, which keeps it proportional to the cache.
+        self._watchers: DefaultDict[str, Set[str]] = defaultdict(set)
+        self._watcher_count = 0
+        self._prune_at = settings.BID_STATUS_CACHE_SIZE
+        # Bumped on every invalidation. Each item and user remembers the generation of
+        # its last invalidation, so a result computed before an invalidation of one of
+        # its items or its user is never cached after it, while invalidations of other
+        # items don't hold it back. Once either map outgrows the cache both are
+        # dropped, and _floor rejects every result computed before that.
+        self._generation = 0
+        self._item_generations: Dict[str, int] = {}
+        self._user_generations: Dict[str, int] = {}
+        self._floor = 0
+        self._lock = threading.Lock()
+
+    def get(self, email: str) -> Optional[bytes]:
+        """Returns the user's cached, already encoded BidStatusExport."""
+        return self._cache.get(email)
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def set(
+        self, email: str, body: bytes, item_names: Iterable[str], generation: int
+    ) -> None:
+        """
+        Caches the encoded status covering item_names, unless the user or one of the
+        items was invalidated since generation was read.
+        """
+        item_names = list(item_names)
+        with self._lock:
+            if generation < self._floor:
+                return
+            if self._user_generations.get(email, 0) > generation or any(
+                self._item_generations.get(name, 0) > generation for name in item_names
+            ):
+                return
+            for item_name in item_names:
+                emails = self._watchers[item_name]
+                if email not in emails:
+                    emails.add(email)
+                    self._watcher_count += 1
+            self._cache.set(email, body)
+            if self._watcher_count > self._prune_at:
+                self._prune_watchers()
+
+    def _prune_watchers(self) -> None:
+        """Needs _lock."""
+        for item_name in list(self._watchers):
+            emails = {email for email in self._watchers[item_name] if email in self._cache}
+            self._watcher_count -= len(self._watchers[item_name]) - len(emails)
+            if emails:
+                self._watchers[item_name] = emails
+            else:
+                del self._watchers[item_name]
+        self._prune_at = max(settings.BID_STATUS_CACHE_SIZE, 2 * self._watcher_count)
+
+    def _bump(self, generations: Dict[str, int], key: str) -> None:
+        """Needs _lock."""
+        self._generation += 1
+        generations[key] = self._generation
+        if len(generations) > settings.BID_STATUS_CACHE_SIZE:
+            self._item_generations.clear()
+            self._user_generations.clear()
+            self._floor = self._generation
+
+    def invalidate_item(self, item_name: str) -> None:
+        with self._lock:
+            self._bump(self._item_generations, item_name)
+            emails = self._watchers.pop(item_name, set())
+            self._watcher_count -= len(emails)
+        for email in emails:
+            self._cache.invalidate(email)
+
+    def invalidate_user(self, email: str) -> None:
+        with self._lock:
+            self._bump(self._user_generations, email)
+        self._cache.invalidate(email)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._item_generations.clear()
+            self._user_generations.clear()
+            self._floor = self._generation
+            self._watchers.clear()
+            self._watcher_count = 0
+        self._cache.clear()
+
+
+bid_status_cache = BidStatusCache()
+
+
+def _on_bid(payload: str) -> None:
+    change = json.loads(payload)
+    bid_status_cache.invalidate_item(change["item_name"])
+    # The bidder may not have had this item in their cached status yet.
+    bid_status_cache.invalidate_user(change["email"])
+
+
+def _on_item(item_name: str) -> None:
+    if item_name == "*":
+        bid_status_cache.clear()
+    else:
+        bid_status_cache.invalidate_item(item_name)
+
+
+listener.subscribe(BID_CHANNEL, _on_bid)
+listener.subscribe(ITEM_CHANNEL, _on_item)
@@ -0,0 +1,144 @@
+"""
+Atomic bid placement.
+
+A bid is validated and committed while holding a row lock on its item, so
+concurrent bidders on the same item are serialized and exactly one of them can
+take over the winning bid. In the uncontended case this costs one locking read
+and one write statement before the commit.
+"""
+
+import json
+import uuid
+from datetime import datetime
+
+from pytz import timezone
+from sqlalchemy import text
+from sqlmodel import select
+
+from src.exceptions import (
+    bid_below_current_exception,
+    bid_below_starting_exception,
+    bid_increment_too_small_exception,
+    bid_outbid_exception,
+    item_not_found_exception,
+)
+from src.metrics import bid_outcomes
+from src.models import BidInternal, ItemInternal
+from src.notifications import envelope, listener
+from src.settings import settings
+
+# Published with {"item_name", "bid", "email"} whenever a new winning bid commits.
+BID_CHANNEL = "bids"
+
+# Inserts the bid, makes it the item's winning bid, counts it in the analytics
+# summary tables and queues the NOTIFY for other workers in a single statement.
+_insert_winning_bid = text(
+    """
+    WITH new_bid AS (
+        INSERT INTO bids (id, bid, email, time_placed, item_name)
+        VALUES (:id, :bid, :email, :time_placed, :item_name)
+        RETURNING id, floor(extract(epoch FROM time_placed) / 60)::bigint AS minute
+    ), crowned AS (
+        UPDATE items SET winning_bid_id = (SELECT id FROM new_bid)
+        WHERE name = :item_name
+        RETURNING name
+    ), bidder AS (
+        INSERT INTO bidders (email) VALUES (:email) ON CONFLICT DO NOTHING
+    ), item_stats AS (
+        -- The subquery sees the bids table as it was before this statement's insert.
+        INSERT INTO item_bid_stats (item_name, bids, bidders, winning_bid)
+        VALUES (:item_name, 1, 1, :bid)
+        ON CONFLICT (item_name) DO UPDATE SET
+            bids = item_bid_stats.bids + 1,
+            bidders = item_bid_stats.bidders + CASE WHEN EXISTS (
+                SELECT 1 FROM bids WHERE email = :email AND item_name = :item_name
+            ) THEN 0 ELSE 1 END,
+            winning_bid = EXCLUDED.winning_bid
+    ), minute_stats AS (
+        INSERT INTO item_bid_minutes (item_name, minute, bids)
+        SELECT :item_name, minute, 1 FROM new_bid
+        ON CONFLICT (item_name, minute) DO UPDATE SET bids = item_bid_minutes.bids + 1
+    )
+    SELECT pg_notify(:channel, :payload) FROM crowned
+    """
+)
+
+
+async def commit_bid(session, item_name: str, amount: float, email: str) -> BidInternal:
+    """
+    Places a bid of amount on item_name for email and commits it. Raises the matching
+    HTTPException if the item does not exist or the bid does not beat the current one.
+    """
+    current_bid = (
+        select(BidInternal.bid)
+        .where(BidInternal.id == ItemInternal.winning_bid_id)
+        .scalar_subquery()
+    )
+    result = await session.execute(
+        select(
+            ItemInternal.original_bid,
+            ItemInternal.winning_bid_id,
+            current_bid.label("current_bid"),
+        )
+        .where(ItemInternal.name == item_name)
+        .with_for_update(of=ItemInternal)
+    )
+    item = result.first()
+    if not item:
+        bid_outcomes.labels("item_not_found").inc()
+        raise item_not_found_exception
+
+    current_amount = item.current_bid
+    outbid_while_waiting = False
+    if item.winning_bid_id is not None and current_amount is None:
+        # Another bid committed while we waited for the row lock. The lock returns the
+        # item's new winning_bid_id, but the bid row itself is newer than this
+        # statement's snapshot, so read it again with a fresh one.
+        result = await session.execute(
+            select(BidInternal.bid).where(BidInternal.id == item.winning_bid_id)
+        )
+        current_amount = result.scalar_one()
+        outbid_while_waiting = True
+
+    if item.winning_bid_id is None:
+        # If this is first bid, don't enforce delta and make equality < instead of <=
+        if amount < item.original_bid:
+            bid_outcomes.labels("below_starting").inc()
+            raise bid_below_starting_exception
+    elif (
+        amount <= current_amount
+        or amount - current_amount < settings.minimum_bid_increment
+    ):
+        if outbid_while_waiting:
+            bid_outcomes.labels("outbid").inc()
+            raise bid_outbid_exception
+        if amount <= current_amount:
+            bid_outcomes.labels("below_current").inc()
+            raise bid_below_current_exception
+        bid_outcomes.labels("below_increment").inc()
+        raise bid_increment_too_small_exception
+
+    bid = BidInternal(
+        id=str(uuid.uuid4()),
+        item_name=item_name,
+        bid=amount,
+        email=email,
+        time_placed=datetime.now(timezone("EST")),
+    )
+    payload = json.dumps({"item_name": item_name, "bid": amount, "email": email})
+    await session.execute(
+        _insert_winning_bid,
+        {
+            "id": bid.id,
+            "bid": bid.bid,
+            "email": bid.email,
+            "time_placed": bid.time_placed,
+            "item_name": bid.item_name,
+            "channel": BID_CHANNEL,
+            "payload": envelope(payload),
+        },
+    )
+    await session.commit()
+    bid_outcomes.labels("accepted").inc()
+    listener.publish_local(BID_CHANNEL, payload)
+    return bid
@@ -0,0 +1,123 @@
+"""
+Cached, pre-serialized item catalog for GET /items/items.
+
+The catalog is rebuilt at most once per change: bids and item writes invalidate
+it on every worker (locally and over NOTIFY), and the next request rebuilds the
+JSON body, its gzipped copy and its ETag. Until then, polls are served from
+memory, or answered with 304 Not Modified when the client already has the
+current ETag. Snapshots
+older than CATALOG_SNAPSHOT_MAX_AGE are rebuilt anyway, which bounds staleness if
+a notification from another worker is missed.
+"""
+
+import asyncio
+import hashlib
+import threading
+import time
+from typing import Optional, Tuple
+
+import orjson
+
+from src.bidding import BID_CHANNEL
+from src.compression import gzip_body
+from src.database import get_async_session
+from src.models import ItemInternal
+from src.notifications import listener, notify_clause
+from src.queries import item_export_dict, item_export_query
+from src.settings import settings
+
+# Published with the item name whenever an item is created, updated or deleted, or
+# with "*" when many items change at once.
+ITEM_CHANNEL = "items"
+
+
+class CatalogSnapshot:
+    def __init__(self):
+        self._version = 0
+        # (body, gzipped body, etag, built_at), replaced as a whole so readers never
+        # see a mix.
+        self._snapshot: Optional[Tuple[bytes, bytes, str, float]] = None
+        self._state_lock = threading.Lock()
+        self._rebuild_lock: Optional[asyncio.Lock] = None
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def invalidate(self, payload: str = None) -> None:
+        with self._state_lock:
+            self._version += 1
+            self._snapshot = None
+
+    def _current(self) -> Optional[Tuple[bytes, bytes, str]]:
+        snapshot = self._snapshot
+        if snapshot is None:
+            return None
+        body, gzipped, etag, built_at = snapshot
+        if time.monotonic() - built_at > settings.CATALOG_SNAPSHOT_MAX_AGE:
+            return None
+        return body, gzipped, etag
+
+    async def get(self) -> Tuple[bytes, bytes, str]:
+        """
+        Returns the serialized catalog, the same body gzipped, and the ETag of the
+        uncompressed body (see compression.gzip_etag), rebuilding them if stale.
+        """
+        current = self._current()
+        if current is not None:
+            return current
+
+        if self._rebuild_lock is None:
+            self._rebuild_lock = asyncio.Lock()
+        async with self._rebuild_lock:
+            # Another request may have rebuilt the snapshot while we waited.
+            current = self._current()
+            if current is not None:
+                return current
+
+            version = self._version
+            built_at = time.monotonic()
+            body = await self._build()
+            gzipped = gzip_body(body)
+            etag = f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+            with self._state_lock:
+                # Don't cache a body that was invalidated while it was being built.
+                if self._version == version:
+                    self._snapshot = (body, gzipped, etag, built_at)
+            return body, gzipped, etag
+
+    async def _build(self) -> bytes:
+        session = get_async_session()
+        try:
+            result = await session.execute(
+                item_export_query().order_by(ItemInternal.name)
+            )
+            items = [item_export_dict(row) for row in result.all()]
+            return orjson.dumps({"items": items, "next_cursor": None})
+        finally:
+            await session.close()
+
+
+catalog = CatalogSnapshot()
+
+listener.subscribe(BID_CHANNEL, catalog.invalidate)
+listener.subscribe(ITEM_CHANNEL, catalog.invalidate)
+
+
+def notify_item_changed(session, item_name: str) -> None:
+    """
+    Queues a change notification for item_name on session. Call before committing an
+    item write, then call item_changed() once it has committed.
+    """
+    session.execute(notify_clause(ITEM_CHANNEL, item_name))
+
+
+def item_changed(item_name: str) -> None:
+    listener.publish_local(ITEM_CHANNEL, item_name)
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
@@ -0,0 +1,119 @@
+"""
+Gzip compression of large responses.
+
+Bodies of at least GZIP_MINIMUM_SIZE bytes are compressed for clients that accept
+gzip, including streamed bodies, which are flushed chunk by chunk. Server-sent
+events (text/event-stream) are never compressed, since buffering in the
+compressor would delay events. Responses that already set Content-Encoding,
+such as the pre-compressed catalog snapshot, pass through untouched.
+
+A strong ETag identifies one exact byte sequence, so a compressed body gets a
+distinct ETag (see gzip_etag) from the uncompressed one.
+"""
+
+import zlib
+from typing import Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+
+from src.settings import settings
+
+GZIP_WBITS = 16 + zlib.MAX_WBITS  # zlib stream with a gzip header and trailer
+
+
+def accepts_gzip(accept_encoding: Optional[str]) -> bool:
+    if not accept_encoding:
+        return False
+    for coding in accept_encoding.split(","):
+        name, _, params = coding.strip().partition(";")
+        if name.strip().lower() in ("gzip", "*"):
+            return params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+    return False
+
+
+def gzip_etag(etag: str) -> str:
+    """The ETag of the gzipped representation of a body with the given ETag."""
+    if etag.startswith("W/") or not etag.endswith('"'):
+        return etag  # Weak validators don't promise identical bytes.
+    return etag[:-1] + '-gz"'
+
+
+def gzip_body(body: bytes) -> bytes:
+    compressor = zlib.compressobj(settings.GZIP_LEVEL, zlib.DEFLATED, GZIP_WBITS)
+    return compressor.compress(body) + compressor.flush()
+
+
+class CompressionMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not accepts_gzip(
+            Headers(scope=scope).get("accept-encoding")
+        ):
+            return await self.app(scope, receive, send)
+
+        await self.app(scope, receive, _GZipResponder(send).send)
+
+
+class _GZipResponder:
+    def __init__(self, send):
+        self._send = send
+        self._start_message = None
+        self._started = False
+        self._compressor = None
+
+    async def send(self, message):
+        if message["type"] == "http.response.start":
+            # Held back until the first body chunk shows whether to compress.
+            self._start_message = message
+            return
+        if message["type"] != "http.response.body":
+            return await self._send(message)
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if not self._started:
+            self._started = True
+            headers = MutableHeaders(scope=self._start_message)
+            if (
+                "content-encoding" in headers
+                or headers.get("content-type", "").startswith("text/event-stream")
+                or (not more_body and len(body) < settings.GZIP_MINIMUM_SIZE)
+            ):
+                await self._send(self._start_message)
+                return await self._send(message)
+
+            self._compressor = zlib.compressobj(
+                settings.GZIP_LEVEL, zlib.DEFLATED, GZIP_WBITS
+            )
+            headers["Content-Encoding"] = "gzip"
+            headers.add_vary_header("Accept-Encoding")
+            if "etag" in headers:
+                headers["ETag"] = gzip_etag(headers["ETag"])
+            if "content-length" in headers:
+                del headers["Content-Length"]
+            body = self._compress(body, more_body)
+            if not more_body:
+                headers["Content-Length"] = str(len(body))
+            await self._send(self._start_message)
+            return await self._send(
+                {"type": "http.response.body", "body": body, "more_body": more_body}
+            )
+
+        if self._compressor is None:
+            return await self._send(message)
+        await self._send(
+            {
+                "type": "http.response.body",
+                "body": self._compress(body, more_body),
+                "more_body": more_body,
+            }
+        )
+
+    def _compress(self, body: bytes, more_body: bool) -> bytes:
+        data = self._compressor.compress(body)
+        if more_body:
+            return data + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+        return data + self._compressor.flush()
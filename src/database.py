@@ -2,35 +2,221 @@
 This module instantiates the database and tables.
 """
 
+import asyncio
 import logging
+import threading
+import time
 from datetime import datetime, timedelta
 
+from sqlalchemy import exc, inspect, text
+from sqlalchemy.ext.asyncio import create_async_engine
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import NullPool
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, QueuePool
+from src.metrics import instrument_engine
 from src.settings import settings
 from sqlalchemy_utils import create_database, database_exists
 from sqlmodel import Session as SQLModelSession
 from sqlmodel import SQLModel, create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 last_generation_time = datetime.now() - timedelta(minutes=15)
 cur_token = ""
 
+_engine = None
+_session_factory = None
+_async_engine = None
+_async_session_factory = None
+_engine_lock = threading.Lock()
 
-def __get_engine():
+
+class PoolStats:
+    """Running counters for connection checkouts from the process-wide pool."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.checkouts = 0
+            self.timeouts = 0
+            self.total_wait = 0.0
+            self.max_wait = 0.0
+
+    def record_checkout(self, wait: float):
+        with self._lock:
+            self.checkouts += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+
+    def record_timeout(self):
+        with self._lock:
+            self.timeouts += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "total_wait_seconds": self.total_wait,
+                "max_wait_seconds": self.max_wait,
+                "avg_wait_seconds": (
+                    self.total_wait / self.checkouts if self.checkouts else 0.0
+                ),
+            }
+
+
+pool_stats = PoolStats()
+async_pool_stats = PoolStats()
+
+
+class _CheckoutTimingMixin:
+    """Records how long callers wait for a connection from the pool."""
+
+    stats: PoolStats
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            self.stats.record_timeout()
+            raise
+        self.stats.record_checkout(time.perf_counter() - start)
+        return connection
+
+
+class InstrumentedQueuePool(_CheckoutTimingMixin, QueuePool):
+    stats = pool_stats
+
+
+class InstrumentedAsyncQueuePool(_CheckoutTimingMixin, AsyncAdaptedQueuePool):
+    stats = async_pool_stats
+
+
+def database_url() -> str:
     connection_uri = settings.DATABASE_URL
     if connection_uri[:9] == "postgres:":
         connection_uri = connection_uri.replace("postgres:", "postgresql:", 1)
+    return connection_uri
+
+
+def async_database_url() -> str:
+    return database_url().replace("postgresql:", "postgresql+asyncpg:", 1)
+
+
+def __pool_kwargs(poolclass) -> dict:
+    if settings.DATABASE_PGBOUNCER:
+        return {"poolclass": NullPool}
+    return {
+        "poolclass": poolclass,
+        "pool_size": settings.DATABASE_POOL_SIZE,
+        "max_overflow": settings.DATABASE_MAX_OVERFLOW,
+        "pool_timeout": settings.DATABASE_POOL_TIMEOUT,
+        "pool_recycle": settings.DATABASE_POOL_RECYCLE,
+        "pool_pre_ping": settings.DATABASE_POOL_PRE_PING,
+    }
 
+
+def __build_engine():
     return create_engine(
-        connection_uri,
-        poolclass=NullPool,
+        database_url(),
         isolation_level="READ COMMITTED",
+        **__pool_kwargs(InstrumentedQueuePool),
     )
 
 
+def __build_async_engine():
+    connect_args = {}
+    if settings.DATABASE_PGBOUNCER:
+        # PgBouncer in transaction mode cannot route named prepared statements.
+        connect_args = {"statement_cache_size": 0, "prepared_statement_cache_size": 0}
+
+    return create_async_engine(
+        async_database_url(),
+        isolation_level="READ COMMITTED",
+        connect_args=connect_args,
+        **__pool_kwargs(InstrumentedAsyncQueuePool),
+    )
+
+
+def get_engine():
+    """Returns the process-wide engine, creating it on first use."""
+    global _engine, _session_factory
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = __build_engine()
+                instrument_engine(_engine)
+                _session_factory = sessionmaker(bind=_engine, class_=SQLModelSession)
+    return _engine
+
+
+def get_async_engine():
+    """Returns the process-wide async engine, creating it on first use."""
+    global _async_engine, _async_session_factory
+    if _async_engine is None:
+        with _engine_lock:
+            if _async_engine is None:
+                _async_engine = __build_async_engine()
+                instrument_engine(_async_engine.sync_engine)
+                _async_session_factory = sessionmaker(
+                    bind=_async_engine, class_=AsyncSession, expire_on_commit=False
+                )
+    return _async_engine
+
+
+def dispose_engine():
+    """Closes all pooled sync connections. Call after forking or on shutdown."""
+    global _engine, _session_factory
+    with _engine_lock:
+        if _engine is not None:
+            _engine.dispose()
+        _engine = None
+        _session_factory = None
+
+
+async def dispose_async_engine():
+    """Closes all pooled async connections. Call on shutdown."""
+    global _async_engine, _async_session_factory
+    engine = _async_engine
+    _async_engine = None
+    _async_session_factory = None
+    if engine is not None:
+        await engine.dispose()
+
+
+def __describe_pool(pool, stats: PoolStats) -> dict:
+    status = {"pool_class": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        status.update(
+            {
+                "size": pool.size(),
+                "checked_in": pool.checkedin(),
+                "checked_out": pool.checkedout(),
+                "overflow": pool.overflow(),
+                "max_overflow": settings.DATABASE_MAX_OVERFLOW,
+            }
+        )
+    status.update(stats.snapshot())
+    return status
+
+
+def get_pool_status() -> dict:
+    """
+    Returns the current state of the sync and async connection pools along with
+    their cumulative checkout statistics, for sizing DATABASE_POOL_SIZE /
+    DATABASE_MAX_OVERFLOW.
+    """
+    return {
+        "sync": __describe_pool(get_engine().pool, pool_stats),
+        "async": __describe_pool(get_async_engine().sync_engine.pool, async_pool_stats),
+    }
+
+
 def create_db():
     """Initialize db with an engine"""
-    engine = __get_engine()
+    engine = get_engine()
 
     if db_exists():
         logging.warning(f"Database Already Exists, Proceeding...")
@@ -40,8 +226,56 @@ def create_db():
 
     # Import all models to be created by SQLModel engine.
     import src.models  # noqa
+    from src.migrations import migrate, stamp_latest
 
+    fresh = not inspect(engine).has_table("items")
     SQLModel.metadata.create_all(engine)
+    if fresh:
+        stamp_latest(engine)
+    else:
+        migrate(engine)
+
+
+async def verify_schema() -> int:
+    """Checks that migrations are up to date, using one connection from the async pool."""
+    from src.migrations import check_schema_version
+
+    async with get_async_engine().connect() as connection:
+        return await connection.run_sync(check_schema_version)
+
+
+def __warm_sync_pool(connections: int) -> None:
+    opened = []
+    try:
+        for _ in range(connections):
+            opened.append(get_engine().connect())
+        for connection in opened:
+            connection.execute(text("SELECT 1"))
+    finally:
+        for connection in opened:
+            connection.close()
+
+
+async def __warm_async_pool(connections: int) -> None:
+    engine = get_async_engine()
+
+    async def ping():
+        async with engine.connect() as connection:
+            await connection.execute(text("SELECT 1"))
+
+    await asyncio.gather(*(ping() for _ in range(connections)))
+
+
+async def warm_pools() -> None:
+    """
+    Opens DATABASE_POOL_WARM_CONNECTIONS connections in each pool, so the first
+    requests don't pay for connection setup.
+    """
+    connections = 1 if settings.DATABASE_PGBOUNCER else settings.DATABASE_POOL_WARM_CONNECTIONS
+    await asyncio.gather(
+        asyncio.to_thread(__warm_sync_pool, connections),
+        __warm_async_pool(connections),
+    )
 
 
 def get_session():
@@ -53,8 +287,8 @@ def get_session():
     :rtype: session
 
     """
-    Session = sessionmaker(bind=__get_engine(), class_=SQLModelSession)
-    return Session()
+    get_engine()
+    return _session_factory()
 
 
 def session_dep():
@@ -67,10 +301,29 @@ def session_dep():
         session.close()
 
 
+def get_async_session() -> AsyncSession:
+    """
+    Returns a new async session bound to the async engine. As with get_session, prefer
+    async_session_dep which commits and closes the session.
+    """
+    get_async_engine()
+    return _async_session_factory()
+
+
+async def async_session_dep():
+    """Yields an async db session for dependency injection"""
+    session = get_async_session()
+    try:
+        yield session
+    finally:
+        await session.commit()
+        await session.close()
+
+
 def db_exists():
     """
     Checks if the auth database exists
     :return: True if database exists, False otherwise
     """
 
-    return database_exists(__get_engine().url)
+    return database_exists(get_engine().url)
@@ -4,6 +4,7 @@ from starlette.status import (
     HTTP_403_FORBIDDEN,
     HTTP_404_NOT_FOUND,
     HTTP_409_CONFLICT,
+    HTTP_503_SERVICE_UNAVAILABLE,
 )
 
 from src.settings import settings
@@ -28,6 +29,22 @@ item_update_bid_conflict_exception = HTTPException(
     detail="Unable to update auction item. You may not change the bid amount if bids have already been placed.",
 )
 
+image_job_not_found_exception = HTTPException(
+    status_code=HTTP_404_NOT_FOUND,
+    detail="Unable to find image job with provided id. Jobs are only kept for a limited time.",
+)
+
+import_manifest_invalid_exception = HTTPException(
+    status_code=HTTP_400_BAD_REQUEST,
+    detail="Unable to import items. The manifest must be a CSV file or a JSON list of items.",
+)
+
+import_archive_invalid_exception = HTTPException(
+    status_code=HTTP_400_BAD_REQUEST,
+    detail="Unable to import items. The images must be uploaded as a ZIP archive.",
+)
+
+
 bid_increment_too_small_exception = HTTPException(
     status_code=HTTP_400_BAD_REQUEST,
     detail=f"Unable to place bid. The minimum bid increment is ${settings.minimum_bid_increment}.",
@@ -42,3 +59,19 @@ bid_below_starting_exception = HTTPException(
     status_code=HTTP_400_BAD_REQUEST,
     detail="Unable to place bid. The bid amount must be above the starting bid.",
 )
+
+bid_outbid_exception = HTTPException(
+    status_code=HTTP_409_CONFLICT,
+    detail="Unable to place bid. You have been outbid by another bid that was placed at the same time.",
+)
+
+bid_history_cursor_invalid_exception = HTTPException(
+    status_code=HTTP_400_BAD_REQUEST,
+    detail="Invalid bid history cursor.",
+)
+
+auth_overloaded_exception = HTTPException(
+    status_code=HTTP_503_SERVICE_UNAVAILABLE,
+    detail="Too many sign-in requests right now. Please try again in a few seconds.",
+    headers={"Retry-After": str(settings.PASSWORD_HASH_RETRY_AFTER)},
+)
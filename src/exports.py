@@ -0,0 +1,128 @@
+"""
+Streaming exports of winning bids for checkout.
+
+Rows are read through a server-side cursor, ordered by winner, EXPORT_FETCH_SIZE
+at a time, and each batch is written out as one chunk, so memory use stays flat
+regardless of the number of items and bidders and the response iterator only
+crosses into the threadpool once per batch. With grouping enabled, each winner's
+items are folded into one record with their invoice total.
+"""
+
+import csv
+import io
+import json
+from itertools import groupby
+from typing import Iterable, Iterator, List
+
+from sqlmodel import select
+
+from src.database import get_session
+from src.models import BidInternal, ItemInternal, UserInternal
+
+EXPORT_FETCH_SIZE = 500
+
+WINNER_COLUMNS = ["email", "first_name", "last_name", "item_name", "winning_bid"]
+GROUPED_WINNER_COLUMNS = ["email", "first_name", "last_name", "items", "item_count", "total"]
+
+
+def _winning_batches(session) -> Iterator[list]:
+    """Yields the winning bids, ordered by winner, EXPORT_FETCH_SIZE rows at a time."""
+    result = session.execute(
+        select(
+            BidInternal.email,
+            UserInternal.first_name,
+            UserInternal.last_name,
+            BidInternal.item_name,
+            BidInternal.bid.label("winning_bid"),
+        )
+        .join(ItemInternal, ItemInternal.winning_bid_id == BidInternal.id)
+        .join(UserInternal, UserInternal.email == BidInternal.email)
+        .order_by(BidInternal.email, BidInternal.item_name)
+        .execution_options(stream_results=True, max_row_buffer=EXPORT_FETCH_SIZE)
+    )
+    return result.partitions(EXPORT_FETCH_SIZE)
+
+
+def _winner(rows: list) -> dict:
+    return {
+        "email": rows[0].email,
+        "first_name": rows[0].first_name,
+        "last_name": rows[0].last_name,
+        "items": [
+            {"item_name": row.item_name, "winning_bid": row.winning_bid} for row in rows
+        ],
+        "item_count": len(rows),
+        "total": sum(row.winning_bid for row in rows),
+    }
+
+
+def _grouped_batches(batches: Iterable[list]) -> Iterator[List[dict]]:
+    """
+    Folds each winner's rows into one record. A winner's rows can continue in the next
+    batch, so the last winner of every batch is held back until it has been read.
+    """
+    pending = []
+    for batch in batches:
+        rows = pending + batch
+        winners = [list(group) for _, group in groupby(rows, key=lambda row: row.email)]
+        pending = winners.pop()
+        yield [_winner(rows) for rows in winners]
+    if pending:
+        yield [_winner(pending)]
+
+
+def _csv_chunk(lines: Iterable[list]) -> str:
+    chunk = io.StringIO()
+    csv.writer(chunk).writerows(lines)
+    return chunk.getvalue()
+
+
+def _winner_csv_line(winner: dict) -> list:
+    items = "; ".join(
+        f"{item['item_name']} (${item['winning_bid']:.2f})" for item in winner["items"]
+    )
+    return [
+        winner["email"],
+        winner["first_name"],
+        winner["last_name"],
+        items,
+        winner["item_count"],
+        f"{winner['total']:.2f}",
+    ]
+
+
+def export_winners_csv(group_by_winner: bool) -> Iterator[str]:
+    # The session is closed here rather than in a nested generator, so it is released
+    # as soon as the response closes this one, including on client disconnect.
+    session = get_session()
+    try:
+        batches = _winning_batches(session)
+        if not group_by_winner:
+            yield _csv_chunk([WINNER_COLUMNS])
+            for batch in batches:
+                yield _csv_chunk(
+                    [getattr(row, column) for column in WINNER_COLUMNS] for row in batch
+                )
+            return
+
+        yield _csv_chunk([GROUPED_WINNER_COLUMNS])
+        for winners in _grouped_batches(batches):
+            if winners:
+                yield _csv_chunk(_winner_csv_line(winner) for winner in winners)
+    finally:
+        session.close()
+
+
+def export_winners_ndjson(group_by_winner: bool) -> Iterator[str]:
+    session = get_session()
+    try:
+        batches = _winning_batches(session)
+        if group_by_winner:
+            for winners in _grouped_batches(batches):
+                if winners:
+                    yield "".join(json.dumps(winner) + "\n" for winner in winners)
+        else:
+            for batch in batches:
+                yield "".join(json.dumps(row._asdict()) + "\n" for row in batch)
+    finally:
+        session.close()
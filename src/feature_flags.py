@@ -0,0 +1,107 @@
+"""
+In-memory feature flags.
+
+Every worker keeps the whole feature_flags table in memory, so reading a flag
+never touches the database. Changes are published over Postgres NOTIFY and
+applied by every worker as soon as they commit; a periodic reload bounds the
+staleness to FEATURE_FLAG_REFRESH_INTERVAL seconds if a notification is missed.
+"""
+
+import asyncio
+import json
+import logging
+from typing import Dict
+
+from sqlmodel import select
+
+from src.database import get_async_session
+from src.models import FeatureFlag
+from src.notifications import listener, notify_clause
+from src.settings import settings
+
+logger = logging.getLogger("api")
+
+FEATURE_FLAG_CHANNEL = "feature_flags"
+
+# Flags created on startup if missing, with their initial values.
+DEFAULT_FEATURE_FLAGS: Dict[str, bool] = {
+    "enable_bidding": False,
+}
+
+
+class FeatureFlagNotFound(Exception):
+    pass
+
+
+class FeatureFlagStore:
+    def __init__(self):
+        self._flags: Dict[str, bool] = {}
+        self._task = None
+
+    def get(self, flag: str, default: bool = False) -> bool:
+        return self._flags.get(flag, default)
+
+    def all(self) -> Dict[str, bool]:
+        return dict(self._flags)
+
+    def apply(self, flag: str, value: bool) -> None:
+        # Swap in a new dict so readers on other threads never see a partial update.
+        flags = dict(self._flags)
+        flags[flag] = value
+        self._flags = flags
+
+    async def refresh(self) -> None:
+        session = get_async_session()
+        try:
+            result = await session.execute(select(FeatureFlag))
+            self._flags = {row.flag: row.value for row in result.scalars().all()}
+        finally:
+            await session.close()
+
+    async def start(self) -> None:
+        await self.refresh()
+        self._task = asyncio.create_task(self._poll())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def _on_notify(self, payload: str) -> None:
+        change = json.loads(payload)
+        self.apply(change["flag"], change["value"])
+
+    async def _poll(self):
+        while True:
+            await asyncio.sleep(settings.FEATURE_FLAG_REFRESH_INTERVAL)
+            try:
+                await self.refresh()
+            except Exception as err:
+                logger.warning(f"Unable to refresh feature flags: {err}")
+
+
+feature_flags = FeatureFlagStore()
+
+listener.subscribe(FEATURE_FLAG_CHANNEL, feature_flags._on_notify)
+
+
+def ensure_default_flags(session) -> None:
+    """Creates any missing flags from DEFAULT_FEATURE_FLAGS."""
+    existing = {row.flag for row in session.query(FeatureFlag.flag).all()}
+    for flag, value in DEFAULT_FEATURE_FLAGS.items():
+        if flag not in existing:
+            session.add(FeatureFlag(flag=flag, value=value))
+    session.commit()
+
+
+def set_feature_flag(flag: str, value: bool, session) -> None:
+    """Persists a flag and notifies every worker once the change commits."""
+    db_result = session.query(FeatureFlag).filter(FeatureFlag.flag == flag).first()
+    if not db_result:
+        raise FeatureFlagNotFound(f"Feature flag [{flag}] not found")
+
+    payload = json.dumps({"flag": flag, "value": value})
+    db_result.value = value
+    session.execute(notify_clause(FEATURE_FLAG_CHANNEL, payload))
+    session.commit()
+    listener.publish_local(FEATURE_FLAG_CHANNEL, payload)
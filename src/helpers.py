@@ -1,29 +1,33 @@
-import boto3
-from src.models import FeatureFlag
+import threading
+
 from src.database import session_dep
+from src.feature_flags import feature_flags, set_feature_flag
 from src.settings import settings
 from fastapi import Depends
 
-s3_client = boto3.client(
-    "s3",
-    aws_access_key_id=settings.AWS_ACCESS_KEY,
-    aws_secret_access_key=settings.AWS_SECRET_KEY,
-)
+_s3_client = None
+_s3_client_lock = threading.Lock()
+
+
+def get_s3_client():
+    """Returns the process-wide S3 client, importing boto3 and creating it on first use."""
+    global _s3_client
+    if _s3_client is None:
+        with _s3_client_lock:
+            if _s3_client is None:
+                import boto3
+
+                _s3_client = boto3.client(
+                    "s3",
+                    aws_access_key_id=settings.AWS_ACCESS_KEY,
+                    aws_secret_access_key=settings.AWS_SECRET_KEY,
+                )
+    return _s3_client
 
 
 def set_bidding_enabled(result: bool, session=Depends(session_dep)) -> None:
-    db_result = (
-        session.query(FeatureFlag).filter(FeatureFlag.flag == "enable_bidding").first()
-    )
-    if db_result:
-        db_result.value = result
-        session.commit()
-    else:
-        raise Exception("Bidding feature flag not found")
-
-
-def is_bidding_enabled(session=Depends(session_dep)) -> bool:
-    db_result = (
-        session.query(FeatureFlag).filter(FeatureFlag.flag == "enable_bidding").first()
-    )
-    return db_result and db_result.value
+    set_feature_flag("enable_bidding", result, session)
+
+
+def is_bidding_enabled() -> bool:
+    return feature_flags.get("enable_bidding")
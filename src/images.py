@@ -0,0 +1,450 @@
+"""
+Item image processing.
+
+Decoding, downscaling and blurhashing are CPU bound, so uploads are handed to a
+background job: the image is rendered in a process pool into a set of variants
+(IMAGE_VARIANT_SIZES, each as WebP plus a JPEG fallback; sizes the source is too
+small for collapse into one full-resolution variant), the variants are
+uploaded to S3 in parallel, and the item's image, image_placeholder and
+image_variants are filled in once the uploads finish. Job status is stored in
+the image_jobs table, so any worker can report it and failures outlive the
+worker. A job that stops being updated, because its worker shut down or died, is
+reported as failed after IMAGE_JOB_TIMEOUT.
+
+Images are stored under their content hash, so identical uploads share one set
+of S3 objects: re-submitting an item's current image is a no-op, and an image
+this worker has already rendered is reused without rendering or uploading it.
+"""
+
+import hashlib
+import io
+import logging
+import multiprocessing
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+
+import blurhash
+from botocore.exceptions import BotoCoreError, ClientError
+from PIL import Image
+from PIL.ImageOps import exif_transpose
+from sqlalchemy import delete, func, update
+
+from src.cache import TTLCache
+from src.catalog import item_changed, notify_item_changed
+from src.database import get_session
+from src.helpers import get_s3_client
+from src.metrics import image_job_duration
+from src.models import ImageJob, ImageJobExport, ImageVariant, ItemInternal
+from src.notifications import WORKER_ID
+from src.settings import settings
+
+logger = logging.getLogger("api")
+
+IMAGE_JOB_PENDING = "pending"
+IMAGE_JOB_PROCESSING = "processing"
+IMAGE_JOB_DONE = "done"
+IMAGE_JOB_FAILED = "failed"
+UNFINISHED_IMAGE_JOB_STATUSES = (IMAGE_JOB_PENDING, IMAGE_JOB_PROCESSING)
+
+
+# Pillow format name -> (file extension, content type)
+VARIANT_FORMATS = {
+    "WEBP": ("webp", "image/webp"),
+    "JPEG": ("jpg", "image/jpeg"),
+}
+
+# The legacy `image` field and the blurhash placeholder use the JPEG variant closest
+# to this size.
+PRIMARY_SIZE = 512
+
+
+# Blurhash only keeps a handful of DCT components, so it is computed from a tiny
+# downsample instead of a full-size variant.
+BLURHASH_SAMPLE_SIZE = 32
+
+# Content-addressed objects never change, so clients and CDNs may cache them forever.
+IMAGE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+def variant_sizes(longest_side: int) -> List[int]:
+    """
+    Returns the configured sizes to render for a source whose longest side is
+    longest_side. Images are never upscaled, so of the sizes at or above it only the
+    smallest is kept, holding the full-resolution image.
+    """
+    sizes = sorted(settings.IMAGE_VARIANT_SIZES)
+    smaller = [size for size in sizes if size < longest_side]
+    full_resolution = [size for size in sizes if size >= longest_side][:1]
+    return smaller + full_resolution
+
+
+def primary_size(sizes: List[int]) -> int:
+    return min(sizes, key=lambda size: abs(size - PRIMARY_SIZE))
+
+
+def image_digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def blurhash_placeholder(image: Image.Image) -> str:
+    sample = image.copy()
+    sample.thumbnail((BLURHASH_SAMPLE_SIZE, BLURHASH_SAMPLE_SIZE))
+    if sample.mode != "RGB":
+        sample = sample.convert("RGB")
+
+    # blurhash.encode re-opens its input with Pillow, so hand it a lossless copy.
+    sample_file = io.BytesIO()
+    sample.save(sample_file, format="PNG")
+    sample_file.seek(0)
+    return blurhash.encode(sample_file, 4, 3)
+
+
+def _encode_variant(image: Image.Image, size: int, image_format: str):
+    variant = image.copy()
+    variant.thumbnail((size, size), Image.LANCZOS)
+    if image_format == "JPEG" and variant.mode not in ("RGB", "L"):
+        variant = variant.convert("RGB")
+
+    output = io.BytesIO()
+    variant.save(output, format=image_format, quality=80)
+    return size, image_format, variant.width, variant.height, output.getvalue()
+
+
+def render_image(data: bytes) -> Tuple[List[tuple], str]:
+    """
+    Renders every size/format variant of an uploaded image and computes its blurhash
+    placeholder. Runs in the image process pool, so it must only depend on its arguments.
+
+    :return: ([(size, format, width, height, bytes), ...], blurhash placeholder)
+    """
+    image = exif_transpose(Image.open(io.BytesIO(data)))
+    image.load()
+
+    # Pillow releases the GIL while resizing and encoding, so the variants of one image
+    # are rendered concurrently within the worker process.
+    with ThreadPoolExecutor(max_workers=len(VARIANT_FORMATS) * 2) as executor:
+        variants = list(
+            executor.map(
+                lambda args: _encode_variant(image, *args),
+                [
+                    (size, image_format)
+                    for size in variant_sizes(max(image.size))
+                    for image_format in VARIANT_FORMATS
+                ],
+            )
+        )
+
+    return variants, blurhash_placeholder(image)
+
+
+def variant_key(digest: str, size: int, image_format: str) -> str:
+    extension, _ = VARIANT_FORMATS[image_format]
+    return f"images/{digest}/{size}.{extension}"
+
+
+def image_url(key: str) -> str:
+    return f"https://{settings.AWS_IMAGE_BUCKET_NAME}.s3.us-east-1.amazonaws.com/{key}"
+
+
+def upload_image(key: str, body: bytes, content_type: str) -> str:
+    """Uploads an image to S3 and returns its public URL."""
+    get_s3_client().upload_fileobj(
+        io.BytesIO(body),
+        settings.AWS_IMAGE_BUCKET_NAME,
+        key,
+        ExtraArgs={"ContentType": content_type, "CacheControl": IMAGE_CACHE_CONTROL},
+    )
+    return image_url(key)
+
+
+def image_exists(key: str) -> bool:
+    try:
+        get_s3_client().head_object(Bucket=settings.AWS_IMAGE_BUCKET_NAME, Key=key)
+    except ClientError:
+        return False
+    return True
+
+
+def release_item_images(item_name: str, image: Optional[str], session) -> None:
+    """
+    Deletes the images of a deleted item unless another item still uses the same image
+    content. Call after the item's deletion has been committed. The deletion stands
+    even if S3 can't be reached, so failures are logged and leave the objects behind.
+    """
+    keys = [f"{item_name}.jpg"]  # Images uploaded before variants were introduced.
+    digest = image_jobs.digest_for_url(image)
+    if digest and not session.query(ItemInternal.name).filter_by(image=image).first():
+        image_jobs.forget(digest)
+        keys += [
+            variant_key(digest, size, image_format)
+            for size in settings.IMAGE_VARIANT_SIZES
+            for image_format in VARIANT_FORMATS
+        ]
+
+    try:
+        get_s3_client().delete_objects(
+            Bucket=settings.AWS_IMAGE_BUCKET_NAME,
+            Delete={"Objects": [{"Key": key} for key in keys], "Quiet": True},
+        )
+    except (BotoCoreError, ClientError):
+        logger.exception(f"Could not delete the images of deleted item [{item_name}]")
+
+
+class ImageJobQueue:
+    def __init__(self):
+        # Content hash -> (variants, placeholder) of images this worker has uploaded.
+        self._rendered = TTLCache(
+            maxsize=settings.IMAGE_HASH_CACHE_SIZE, ttl=settings.IMAGE_HASH_CACHE_TTL
+        )
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+        self._thread_pool: Optional[ThreadPoolExecutor] = None
+        self._upload_pool: Optional[ThreadPoolExecutor] = None
+        self._executors_lock = threading.Lock()
+
+    def _executors(self) -> Tuple[ThreadPoolExecutor, ThreadPoolExecutor]:
+        """Returns the job and upload thread pools, creating them on first use."""
+        if self._upload_pool is None:
+            with self._executors_lock:
+                if self._upload_pool is None:
+                    self._thread_pool = ThreadPoolExecutor(
+                        max_workers=settings.IMAGE_PROCESS_WORKERS * 2,
+                        thread_name_prefix="image-jobs",
+                    )
+                    self._upload_pool = ThreadPoolExecutor(
+                        max_workers=settings.IMAGE_UPLOAD_THREADS,
+                        thread_name_prefix="image-uploads",
+                    )
+        return self._thread_pool, self._upload_pool
+
+    def _render_pool(self) -> ProcessPoolExecutor:
+        """Returns the render process pool, creating it on first use or after it broke."""
+        if self._process_pool is None:
+            with self._executors_lock:
+                if self._process_pool is None:
+                    # Spawn rather than fork: the API process is multi-threaded and holds
+                    # open database connections.
+                    self._process_pool = ProcessPoolExecutor(
+                        max_workers=settings.IMAGE_PROCESS_WORKERS,
+                        mp_context=multiprocessing.get_context("spawn"),
+                    )
+        return self._process_pool
+
+    def _discard_render_pool(self, broken: ProcessPoolExecutor) -> None:
+        with self._executors_lock:
+            # Another job may already have replaced it.
+            if self._process_pool is broken:
+                self._process_pool = None
+        broken.shutdown(wait=False)
+
+    def _render(self, data: bytes):
+        """
+        Renders an image in the process pool. A render process that died (killed for
+        memory, a crash in Pillow) breaks the whole pool, so it is rebuilt and the
+        render retried once.
+        """
+        for attempt in range(2):
+            process_pool = self._render_pool()
+            try:
+                return process_pool.submit(render_image, data).result()
+            except BrokenProcessPool:
+                self._discard_render_pool(process_pool)
+                if attempt:
+                    raise
+                logger.warning("Image render pool broke; rebuilding it and retrying")
+
+    def submit(self, item_name: str, data: bytes) -> ImageJobExport:
+        """Queues an image for item_name and returns the new job."""
+        job, _ = self.enqueue(item_name, data)
+        return job
+
+    def enqueue(self, item_name: str, data: bytes) -> Tuple[ImageJobExport, Future]:
+        """
+        Queues an image for item_name and returns the new job along with a future that
+        completes, without raising, once the job has finished.
+        """
+        job = ImageJobExport(
+            id=str(uuid.uuid4()), item_name=item_name, status=IMAGE_JOB_PENDING
+        )
+        session = get_session()
+        try:
+            session.execute(
+                delete(ImageJob)
+                .where(
+                    ImageJob.updated_at
+                    < func.now() - timedelta(seconds=settings.IMAGE_JOB_RETENTION)
+                )
+                .execution_options(synchronize_session=False)
+            )
+            session.add(
+                ImageJob(
+                    id=job.id, item_name=item_name, status=job.status, worker=WORKER_ID
+                )
+            )
+            session.commit()
+        finally:
+            session.close()
+
+        thread_pool, _ = self._executors()
+        return job, thread_pool.submit(self._run, job, data)
+
+    def get(self, job_id: str) -> Optional[ImageJobExport]:
+        session = get_session()
+        try:
+            job = session.get(ImageJob, job_id)
+        finally:
+            session.close()
+        if job is None:
+            return None
+
+        export = ImageJobExport(
+            id=job.id, item_name=job.item_name, status=job.status, error=job.error
+        )
+        timeout = timedelta(seconds=settings.IMAGE_JOB_TIMEOUT)
+        if (
+            job.status in UNFINISHED_IMAGE_JOB_STATUSES
+            and datetime.now(timezone.utc) - job.updated_at > timeout
+        ):
+            export.status = IMAGE_JOB_FAILED
+            export.error = "The job stopped making progress; its worker may have restarted."
+        return export
+
+    @staticmethod
+    def _update(job_id: str, status: str, error: str = None) -> None:
+        session = get_session()
+        try:
+            session.execute(
+                update(ImageJob)
+                .where(ImageJob.id == job_id)
+                .values(status=status, error=error, updated_at=func.now())
+                .execution_options(synchronize_session=False)
+            )
+            session.commit()
+        finally:
+            session.close()
+
+    def forget(self, digest: str) -> None:
+        self._rendered.invalidate(digest)
+
+    @staticmethod
+    def digest_for_url(url: Optional[str]) -> Optional[str]:
+        """Returns the content hash of a content-addressed image URL, if it is one."""
+        prefix = image_url("images/")
+        if not url or not url.startswith(prefix):
+            return None
+        return url[len(prefix) :].split("/", 1)[0]
+
+    def _run(self, job: ImageJobExport, data: bytes) -> None:
+        start = time.perf_counter()
+        try:
+            self._update(job.id, IMAGE_JOB_PROCESSING)
+            digest = image_digest(data)
+            rendered = self._rendered.get(digest)
+            # Another worker may have deleted the objects since we cached them.
+            if rendered is None or not image_exists(rendered[0]):
+                rendered = self._render_and_upload(digest, data)
+                self._rendered.set(digest, rendered)
+
+            primary_key, image_variants, image_placeholder = rendered
+            self._save(job, image_url(primary_key), image_placeholder, image_variants)
+            self._update(job.id, IMAGE_JOB_DONE)
+            image_job_duration.labels("total").observe(time.perf_counter() - start)
+        except Exception as err:
+            logger.exception(f"Image job [{job.id}] for [{job.item_name}] failed")
+            try:
+                self._update(job.id, IMAGE_JOB_FAILED, str(err))
+            except Exception:
+                logger.exception(f"Unable to record the failure of image job [{job.id}]")
+
+    def _render_and_upload(self, digest: str, data: bytes):
+        _, upload_pool = self._executors()
+        with image_job_duration.labels("render").time():
+            variants, image_placeholder = self._render(data)
+
+        def upload(variant):
+            size, image_format, width, height, body = variant
+            _, content_type = VARIANT_FORMATS[image_format]
+            url = upload_image(variant_key(digest, size, image_format), body, content_type)
+            return ImageVariant(
+                url=url, format=image_format.lower(), width=width, height=height
+            )
+
+        with image_job_duration.labels("upload").time():
+            image_variants = list(upload_pool.map(upload, variants))
+        primary = primary_size([size for size, *_ in variants])
+        return variant_key(digest, primary, "JPEG"), image_variants, image_placeholder
+
+    def _save(
+        self,
+        job: ImageJobExport,
+        image_url: str,
+        image_placeholder: str,
+        image_variants: List[ImageVariant],
+    ):
+        session = get_session()
+        try:
+            # Locking the item serializes jobs for it that finish at the same time.
+            item = (
+                session.query(ItemInternal)
+                .filter_by(name=job.item_name)
+                .with_for_update()
+                .first()
+            )
+            if not item:
+                return  # Deleted while the image was processing.
+            # A newer upload for the same item, on any worker, supersedes this one.
+            latest = (
+                session.query(ImageJob.id)
+                .filter_by(item_name=job.item_name)
+                .order_by(ImageJob.created_at.desc())
+                .limit(1)
+                .scalar()
+            )
+            if latest != job.id:
+                return
+            item.image = image_url
+            item.image_placeholder = image_placeholder
+            item.image_variants = [variant.dict() for variant in image_variants]
+            notify_item_changed(session, job.item_name)
+            session.commit()
+        finally:
+            session.close()
+        item_changed(job.item_name)
+
+    def shutdown(self) -> None:
+        if self._thread_pool is not None:
+            # Jobs still queued or running here are abandoned.
+            session = get_session()
+            try:
+                session.execute(
+                    update(ImageJob)
+                    .where(
+                        ImageJob.worker == WORKER_ID,
+                        ImageJob.status.in_(UNFINISHED_IMAGE_JOB_STATUSES),
+                    )
+                    .values(
+                        status=IMAGE_JOB_FAILED,
+                        error="The worker processing the job shut down.",
+                        updated_at=func.now(),
+                    )
+                    .execution_options(synchronize_session=False)
+                )
+                session.commit()
+            except Exception:
+                logger.exception("Unable to record the image jobs abandoned at shutdown")
+            finally:
+                session.close()
+        with self._executors_lock:
+            for pool in (self._thread_pool, self._upload_pool, self._process_pool):
+                if pool is not None:
+                    pool.shutdown(wait=False)
+            self._process_pool = None
+            self._thread_pool = None
+            self._upload_pool = None
+
+
+image_jobs = ImageJobQueue()
@@ -0,0 +1,149 @@
+"""
+Bulk item import from a manifest plus a ZIP archive of images.
+
+The manifest is either CSV (columns: name, description, bid, tags, image; tags
+separated by ";") or a JSON list of objects with the same keys, where `image` is
+a file name inside the archive. Every row is validated before anything is
+written, names are checked against the database in a single query, and items
+are inserted in short per-batch transactions; a name taken by an item created in
+the meantime is reported as a conflict. Image processing is handed to the image
+job pool a few images at a time, so an import never holds more than
+ITEM_IMPORT_MAX_PENDING_IMAGES decompressed images in memory, and a result line
+is streamed back per item as it is created.
+"""
+
+import csv
+import io
+import json
+import zipfile
+from collections import deque
+from typing import IO, Iterator, List
+
+from pydantic import ValidationError
+from sqlalchemy.dialects.postgresql import insert
+
+from src.catalog import item_changed, notify_item_changed
+from src.database import get_session
+from src.images import image_jobs
+from src.models import ItemImportRow, ItemInternal
+from src.settings import settings
+
+
+class ManifestError(Exception):
+    pass
+
+
+def parse_manifest(filename: str, data: bytes) -> List[dict]:
+    text = data.decode("utf-8-sig")
+    if filename.lower().endswith(".json"):
+        rows = json.loads(text)
+        if not isinstance(rows, list):
+            raise ManifestError("JSON manifest must be a list of items.")
+        return rows
+
+    rows = []
+    for row in csv.DictReader(io.StringIO(text)):
+        row["tags"] = [tag.strip() for tag in (row.get("tags") or "").split(";") if tag.strip()]
+        rows.append(row)
+    return rows
+
+
+def result_line(name: str, status: str, **fields) -> str:
+    return json.dumps({"name": name, "status": status, **fields}) + "\n"
+
+
+def import_items(manifest_rows: List[dict], archive: IO[bytes]) -> Iterator[str]:
+    """
+    Validates and imports manifest_rows, yielding one NDJSON result line per row.
+    Closes archive once done.
+    """
+    try:
+        images = zipfile.ZipFile(archive)
+        archive_names = set(images.namelist())
+
+        valid: List[ItemImportRow] = []
+        seen = set()
+        for index, raw_row in enumerate(manifest_rows):
+            try:
+                row = ItemImportRow.parse_obj(raw_row)
+            except ValidationError as err:
+                name = raw_row.get("name") if isinstance(raw_row, dict) else None
+                yield result_line(name or f"row {index + 1}", "error", detail=str(err))
+                continue
+
+            if row.name in seen:
+                yield result_line(row.name, "error", detail="Duplicate name in manifest.")
+            elif row.image not in archive_names:
+                yield result_line(row.name, "error", detail="Image not found in archive.")
+            else:
+                seen.add(row.name)
+                valid.append(row)
+
+        session = get_session()
+        try:
+            existing = {
+                name
+                for (name,) in session.query(ItemInternal.name).filter(
+                    ItemInternal.name.in_([row.name for row in valid])
+                )
+            }
+        finally:
+            session.close()
+
+        to_create = []
+        for row in valid:
+            if row.name in existing:
+                yield result_line(
+                    row.name, "error", detail="Auction item with given name already exists."
+                )
+            else:
+                to_create.append(row)
+
+        pending_images = deque()
+        batch_size = settings.ITEM_IMPORT_BATCH_SIZE
+        for start in range(0, len(to_create), batch_size):
+            batch = to_create[start : start + batch_size]
+            statement = (
+                insert(ItemInternal)
+                .values(
+                    [
+                        {
+                            "name": row.name,
+                            "description": row.description,
+                            "original_bid": row.bid,
+                            "tags": row.tags,
+                            "image": "",
+                            "image_placeholder": "",
+                        }
+                        for row in batch
+                    ]
+                )
+                .on_conflict_do_nothing(index_elements=["name"])
+                .returning(ItemInternal.name)
+            )
+            session = get_session()
+            try:
+                created = {name for (name,) in session.execute(statement)}
+                if created:
+                    notify_item_changed(session, "*")
+                session.commit()
+            finally:
+                session.close()
+            if created:
+                item_changed("*")
+
+            for row in batch:
+                if row.name not in created:
+                    yield result_line(
+                        row.name, "error", detail="Auction item with given name already exists."
+                    )
+                    continue
+                # Wait for the oldest image before reading another into memory. Jobs
+                # record their own failures, so the futures never raise.
+                while len(pending_images) >= settings.ITEM_IMPORT_MAX_PENDING_IMAGES:
+                    pending_images.popleft().result()
+                image_job, future = image_jobs.enqueue(row.name, images.read(row.image))
+                pending_images.append(future)
+                yield result_line(row.name, "created", image_job=image_job.id)
+    finally:
+        archive.close()
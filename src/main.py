@@ -1,19 +1,36 @@
+import asyncio
 import logging
 
 from fastapi import FastAPI, Depends
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, ORJSONResponse, Response
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, generate_latest
 from starlette.middleware.cors import CORSMiddleware
 
-from src.database import create_db, get_session, session_dep
-from src.models import FeatureFlag
-from src.routers.auth_router import auth_router, manager
+from src.database import (
+    dispose_async_engine,
+    dispose_engine,
+    get_pool_status,
+    verify_schema,
+    warm_pools,
+)
+from src.compression import CompressionMiddleware
+from src.feature_flags import feature_flags
+from src.images import image_jobs
+from src.metrics import MetricsMiddleware, PoolCollector
+from src.migrations import upgrade_database
+from src.notifications import listener
+from src.passwords import password_hasher
+from src.profiling import SQLProfilingMiddleware
+from src.tokens import token_versions
+from src.routers.auth_router import auth_router, is_admin
 from src.routers.bid_router import bid_router
 from src.routers.item_router import item_router
+from src.settings import settings
 import sqlalchemy
 
 logger = logging.Logger("Main")
 
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse)
 
 app.include_router(
     item_router,
@@ -36,8 +53,6 @@ app.include_router(
     responses={404: {"detail": "Not found"}},
 )
 
-manager.useRequest(app)
-
 logger = logging.getLogger("api")
 
 origins = ["*"]
@@ -50,27 +65,43 @@ app.add_middleware(
     allow_methods=["*"],
 )
 
+if settings.GZIP_ENABLED:
+    app.add_middleware(CompressionMiddleware)
+
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+    REGISTRY.register(PoolCollector())
+
+if settings.SQL_PROFILING_ENABLED:
+    app.add_middleware(SQLProfilingMiddleware)
+
 
 @app.on_event("startup")
-def startup(session=Depends(session_dep)):
+async def startup():
+    if settings.DATABASE_MIGRATE_ON_STARTUP:
+        await asyncio.to_thread(upgrade_database)
+    # Migrations run out of band (python -m src.migrations); only check they have.
+    await verify_schema()
 
-    create_db()
 
-    session = get_session()
-    try:
-        bidding_enabled_flag = FeatureFlag(**{"flag": "enable_bidding", "value": False})
+@app.on_event("startup")
+async def start_notifications():
+    # Listen first, so changes committed while the caches load aren't missed.
+    await listener.start()
+    # Requests can't be authorized or bids accepted before these are loaded, but each
+    # is a single small query, so they load concurrently.
+    await asyncio.gather(feature_flags.start(), token_versions.start())
 
-        flag_exists = (
-            session.query(FeatureFlag)
-            .filter(FeatureFlag.flag == bidding_enabled_flag.flag)
-            .first()
-        )
 
-        if not flag_exists:
-            session.add(bidding_enabled_flag)
-            session.commit()
-    finally:
-        session.close()
+@app.on_event("shutdown")
+async def shutdown():
+    await listener.stop()
+    await feature_flags.stop()
+    await token_versions.stop()
+    image_jobs.shutdown()
+    password_hasher.shutdown()
+    dispose_engine()
+    await dispose_async_engine()
 
 
 @app.get("/")
@@ -78,6 +109,26 @@ def healthcheck():
     return "Checkout EWB Backend is Running!"
 
 
+@app.get("/ready")
+async def readiness():
+    """Readiness probe: checks the schema version and warms both connection pools."""
+    schema_version = await verify_schema()
+    await warm_pools()
+    return {"ready": True, "schema_version": schema_version}
+
+
+@app.get("/metrics", include_in_schema=False, dependencies=[Depends(is_admin)])
+def metrics():
+    """Prometheus metrics for this worker process. Scrape with an admin bearer token."""
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
+@app.get("/pool", dependencies=[Depends(is_admin)])
+def pool_status():
+    """Connection pool usage and checkout wait statistics for this worker."""
+    return get_pool_status()
+
+
 @app.exception_handler(sqlalchemy.exc.OperationalError)
 async def validation_exception_handler(request, err):
     logger.error(f"Database connection error on {request.url}: {err}")
@@ -0,0 +1,181 @@
+"""
+Prometheus metrics, served at GET /metrics.
+
+Request metrics are recorded by MetricsMiddleware, and database metrics by
+SQLAlchemy engine events that add each statement to the current request's
+RequestStats (found through a context variable, so statements run from the
+threadpool or the event loop are both attributed). Connection pool usage is
+collected at scrape time, so it costs nothing between scrapes. Metrics are per
+worker process.
+"""
+
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from prometheus_client import Counter, Histogram
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from sqlalchemy import event
+
+UNMATCHED_ROUTE = "unmatched"
+BACKGROUND_ROUTE = "background"
+
+http_requests = Counter(
+    "http_requests_total", "HTTP requests handled.", ["method", "route", "status"]
+)
+http_request_duration = Histogram(
+    "http_request_duration_seconds",
+    "Time to handle an HTTP request, up to the start of the response.",
+    ["method", "route"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+db_queries = Counter("db_queries_total", "Database statements executed.", ["route"])
+db_query_time = Counter(
+    "db_query_seconds_total", "Time spent executing database statements.", ["route"]
+)
+bid_outcomes = Counter("bid_outcomes_total", "Bid placement attempts.", ["outcome"])
+image_job_duration = Histogram(
+    "image_job_duration_seconds",
+    "Time spent in each stage of image jobs.",
+    ["stage"],
+    buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+
+
+class RequestStats:
+    """Database work done on behalf of one request."""
+
+    __slots__ = ("query_count", "query_time")
+
+    def __init__(self):
+        self.query_count = 0
+        self.query_time = 0.0
+
+    def record_query(self, statement: str, duration: float) -> None:
+        self.query_count += 1
+        self.query_time += duration
+
+
+request_stats: ContextVar[Optional[RequestStats]] = ContextVar(
+    "request_stats", default=None
+)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._query_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    duration = time.perf_counter() - context._query_start
+    stats = request_stats.get()
+    if stats is not None:
+        stats.record_query(statement, duration)
+    else:
+        db_queries.labels(BACKGROUND_ROUTE).inc()
+        db_query_time.labels(BACKGROUND_ROUTE).inc(duration)
+
+
+def instrument_engine(engine) -> None:
+    """Records statement counts and timings for a sync engine (or async_engine.sync_engine)."""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def route_label(scope) -> str:
+    # FastAPI stores the matched route in the scope; fall back to a fixed label so
+    # unknown paths can't blow up the label cardinality.
+    route = scope.get("route")
+    return route.path if route is not None else UNMATCHED_ROUTE
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording per-route request and database metrics."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        # Reuse the stats of an outer profiling middleware so both see every statement.
+        stats = request_stats.get()
+        token = None
+        if stats is None:
+            stats = RequestStats()
+            token = request_stats.set(stats)
+        start = time.perf_counter()
+        status = 500
+        duration = None
+
+        async def send_with_timing(message):
+            nonlocal status, duration
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                duration = time.perf_counter() - start
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            if token is not None:
+                request_stats.reset(token)
+            route = route_label(scope)
+            method = scope["method"]
+            http_requests.labels(method, route, str(status)).inc()
+            http_request_duration.labels(method, route).observe(
+                duration if duration is not None else time.perf_counter() - start
+            )
+            if stats.query_count:
+                db_queries.labels(route).inc(stats.query_count)
+                db_query_time.labels(route).inc(stats.query_time)
+
+
+class PoolCollector:
+    """
+    Reports connection pool usage whenever metrics are scraped. Register it with
+    REGISTRY.register(PoolCollector()) once the app is assembled.
+    """
+
+    def _families(self):
+        gauges = {
+            name: GaugeMetricFamily(f"db_pool_{name}", help_text, labels=["engine"])
+            for name, help_text in [
+                ("size", "Configured pool size."),
+                ("checked_out", "Connections currently in use."),
+                ("checked_in", "Idle connections in the pool."),
+                ("overflow", "Connections open beyond the pool size."),
+            ]
+        }
+        counters = {
+            "checkouts": CounterMetricFamily(
+                "db_pool_checkouts", "Connections checked out.", labels=["engine"]
+            ),
+            "total_wait_seconds": CounterMetricFamily(
+                "db_pool_wait_seconds",
+                "Time spent waiting for a connection.",
+                labels=["engine"],
+            ),
+            "timeouts": CounterMetricFamily(
+                "db_pool_timeouts", "Connection checkouts that timed out.", labels=["engine"]
+            ),
+        }
+        return gauges, counters
+
+    def describe(self):
+        # Static, so registering the collector never builds the engines.
+        gauges, counters = self._families()
+        yield from gauges.values()
+        yield from counters.values()
+
+    def collect(self):
+        from src.database import get_pool_status
+
+        gauges, counters = self._families()
+        for engine_name, status in get_pool_status().items():
+            for key, family in list(gauges.items()) + list(counters.items()):
+                if key in status:
+                    family.add_metric([engine_name], status[key])
+
+        yield from gauges.values()
+        yield from counters.values()
@@ -0,0 +1,252 @@
+"""
+Versioned schema migrations.
+
+create_all only creates missing tables, so changes to existing tables are
+applied here. Each migration runs once, in order, in its own transaction, and
+the highest applied version is recorded in the schema_version table. A freshly
+created database already has the latest schema and is stamped at the latest
+version without running anything.
+
+Migrations are applied out of band, before new workers start:
+
+    python -m src.migrations
+
+Workers only check the recorded version on startup (see check_schema_version),
+unless DATABASE_MIGRATE_ON_STARTUP is set. Every transaction that reads or
+records the version holds a transaction-level advisory lock, so processes
+migrating the same database at once apply each migration exactly once.
+"""
+
+import logging
+from typing import List, Tuple
+
+from sqlalchemy import text
+
+logger = logging.getLogger("api")
+
+# Key of the advisory lock serializing migrations across processes.
+MIGRATION_LOCK_ID = 0x45574233
+
+# (version, description, statements)
+MIGRATIONS: List[Tuple[int, str, List[str]]] = [
+    (
+        1,
+        "Item tag and full-text search indexes",
+        [
+            "CREATE INDEX IF NOT EXISTS ix_items_tags ON items USING gin (tags)",
+            """
+            CREATE OR REPLACE FUNCTION items_search_document(
+                name varchar, description varchar, tags varchar[]
+            ) RETURNS tsvector LANGUAGE sql IMMUTABLE AS $$
+                SELECT setweight(to_tsvector('english', coalesce(name, '')), 'A')
+                    || setweight(to_tsvector('english', coalesce(array_to_string(tags, ' '), '')), 'B')
+                    || setweight(to_tsvector('english', coalesce(description, '')), 'C')
+            $$
+            """,
+            """
+            ALTER TABLE items ADD COLUMN IF NOT EXISTS search_vector tsvector
+            GENERATED ALWAYS AS (items_search_document(name, description, tags)) STORED
+            """,
+            "CREATE INDEX IF NOT EXISTS ix_items_search_vector ON items USING gin (search_vector)",
+        ],
+    ),
+    (
+        2,
+        "Item image variants",
+        [
+            "ALTER TABLE items ADD COLUMN IF NOT EXISTS image_variants jsonb",
+        ],
+    ),
+    (
+        3,
+        "Bid timestamps as timestamptz and bid history indexes",
+        [
+            """
+            DO $$ BEGIN
+                IF (
+                    SELECT data_type FROM information_schema.columns
+                    WHERE table_name = 'bids' AND column_name = 'time_placed'
+                ) <> 'timestamp with time zone' THEN
+                    ALTER TABLE bids ALTER COLUMN time_placed TYPE timestamptz
+                    USING time_placed::timestamptz;
+                END IF;
+            END $$
+            """,
+            "CREATE INDEX IF NOT EXISTS ix_bids_item_name_bid ON bids (item_name, bid DESC)",
+            "CREATE INDEX IF NOT EXISTS ix_bids_item_name_time_placed ON bids (item_name, time_placed, id)",
+        ],
+    ),
+    (
+        4,
+        "Auction analytics summary tables, backfilled from existing bids",
+        [
+            """
+            CREATE TABLE IF NOT EXISTS item_bid_stats (
+                item_name varchar PRIMARY KEY REFERENCES items (name) ON DELETE CASCADE,
+                bids integer NOT NULL,
+                bidders integer NOT NULL,
+                winning_bid float NOT NULL
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS item_bid_minutes (
+                item_name varchar REFERENCES items (name) ON DELETE CASCADE,
+                minute bigint,
+                bids integer NOT NULL,
+                PRIMARY KEY (item_name, minute)
+            )
+            """,
+            "CREATE INDEX IF NOT EXISTS ix_item_bid_minutes_minute ON item_bid_minutes (minute)",
+            "CREATE TABLE IF NOT EXISTS bidders (email varchar PRIMARY KEY)",
+            """
+            INSERT INTO item_bid_stats (item_name, bids, bidders, winning_bid)
+            SELECT b.item_name, count(*), count(DISTINCT b.email), max(w.bid)
+            FROM bids b
+            JOIN items i ON i.name = b.item_name
+            JOIN bids w ON w.id = i.winning_bid_id
+            GROUP BY b.item_name
+            ON CONFLICT DO NOTHING
+            """,
+            """
+            INSERT INTO item_bid_minutes (item_name, minute, bids)
+            SELECT b.item_name, floor(extract(epoch FROM b.time_placed) / 60)::bigint, count(*)
+            FROM bids b
+            JOIN items i ON i.name = b.item_name
+            GROUP BY 1, 2
+            ON CONFLICT DO NOTHING
+            """,
+            "INSERT INTO bidders (email) SELECT DISTINCT email FROM bids ON CONFLICT DO NOTHING",
+        ],
+    ),
+    (
+        5,
+        "Bids by bidder index for the user bid status query",
+        [
+            "CREATE INDEX IF NOT EXISTS ix_bids_email_item_name ON bids (email, item_name)",
+        ],
+    ),
+    (
+        6,
+        "User token versions for token revocation",
+        [
+            "ALTER TABLE users ADD COLUMN IF NOT EXISTS token_version integer NOT NULL DEFAULT 0",
+        ],
+    ),
+    (
+        7,
+        "Image job status shared by every worker",
+        [
+            """
+            CREATE TABLE IF NOT EXISTS image_jobs (
+                id varchar PRIMARY KEY,
+                item_name varchar,
+                status varchar,
+                error varchar,
+                worker varchar,
+                created_at timestamptz NOT NULL DEFAULT now(),
+                updated_at timestamptz NOT NULL DEFAULT now()
+            )
+            """,
+            "CREATE INDEX IF NOT EXISTS ix_image_jobs_item_name ON image_jobs (item_name)",
+            "CREATE INDEX IF NOT EXISTS ix_image_jobs_updated_at ON image_jobs (updated_at)",
+        ],
+    ),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def _ensure_version_table(connection) -> None:
+    connection.execute(
+        text("CREATE TABLE IF NOT EXISTS schema_version (version integer NOT NULL)")
+    )
+
+
+def get_schema_version(connection) -> int:
+    """Returns the applied schema version, or 0 if migrations have never run."""
+    _ensure_version_table(connection)
+    version = connection.execute(text("SELECT max(version) FROM schema_version")).scalar()
+    return version or 0
+
+
+class SchemaVersionError(RuntimeError):
+    pass
+
+
+def read_schema_version(connection) -> int:
+    """Like get_schema_version, but never creates the schema_version table."""
+    if connection.execute(text("SELECT to_regclass('schema_version')")).scalar() is None:
+        return 0
+    version = connection.execute(text("SELECT max(version) FROM schema_version")).scalar()
+    return version or 0
+
+
+def check_schema_version(connection) -> int:
+    """Raises SchemaVersionError unless every migration known to this code has been applied."""
+    version = read_schema_version(connection)
+    if version < LATEST_VERSION:
+        raise SchemaVersionError(
+            f"Database schema is at version [{version}], this code needs [{LATEST_VERSION}]. "
+            f"Run `python -m src.migrations` first."
+        )
+    return version
+
+
+def _set_schema_version(connection, version: int) -> None:
+    connection.execute(text("DELETE FROM schema_version"))
+    connection.execute(
+        text("INSERT INTO schema_version (version) VALUES (:version)"),
+        {"version": version},
+    )
+
+
+def _lock_migrations(connection) -> None:
+    """Blocks until no other transaction holds the migration lock, until commit."""
+    connection.execute(
+        text("SELECT pg_advisory_xact_lock(:key)"), {"key": MIGRATION_LOCK_ID}
+    )
+
+
+def stamp_latest(engine) -> None:
+    """Marks a database created from the current models as fully migrated."""
+    with engine.begin() as connection:
+        _lock_migrations(connection)
+        _ensure_version_table(connection)
+        _set_schema_version(connection, LATEST_VERSION)
+
+
+def migrate(engine) -> int:
+    """Applies every pending migration and returns the resulting schema version."""
+    while True:
+        with engine.begin() as connection:
+            # The version is read under the lock, so a migration another process
+            # applied while this one waited is not applied again.
+            _lock_migrations(connection)
+            current = get_schema_version(connection)
+            pending = [migration for migration in MIGRATIONS if migration[0] > current]
+            if not pending:
+                return current
+
+            version, description, statements = pending[0]
+            logger.warning(f"Applying schema migration [{version}]: {description}")
+            for statement in statements:
+                connection.execute(text(statement))
+            _set_schema_version(connection, version)
+
+
+def upgrade_database():
+    """Creates or upgrades the database and seeds the default feature flags."""
+    from src.database import create_db, get_session
+    from src.feature_flags import ensure_default_flags
+
+    create_db()
+    session = get_session()
+    try:
+        ensure_default_flags(session)
+    finally:
+        session.close()
+    logger.warning(f"Database schema is at version [{LATEST_VERSION}]")
+
+
+if __name__ == "__main__":
+    upgrade_database()
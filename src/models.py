@@ -1,11 +1,25 @@
+from datetime import datetime
 from typing import List, Optional
 
+from pydantic import validator
 from pydantic.main import BaseModel
 from sqlmodel import SQLModel, Field, Relationship
 from sqlalchemy import (
+    DDL as SADDL,
     Column as SAColumn,
-    ARRAY as SAArray,
+    BigInteger as SABigInteger,
+    Computed as SAComputed,
+    DateTime as SADateTime,
+    ForeignKey as SAForeignKey,
+    Index as SAIndex,
     String as SAString,
+    event as SAEvent,
+    text as SAText,
+)
+from sqlalchemy.dialects.postgresql import (
+    ARRAY as SAArray,
+    JSONB as SAJSONB,
+    TSVECTOR as SATSVector,
 )
 from sqlalchemy.orm import RelationshipProperty as SARelationshipProperty
 
@@ -16,11 +30,18 @@ from sqlalchemy.orm import RelationshipProperty as SARelationshipProperty
 
 class BidInternal(SQLModel, table=True):
     __tablename__ = "bids"
+    __table_args__ = (
+        SAIndex("ix_bids_item_name_bid", "item_name", SAText("bid DESC")),
+        SAIndex("ix_bids_item_name_time_placed", "item_name", "time_placed", "id"),
+        SAIndex("ix_bids_email_item_name", "email", "item_name"),
+    )
 
     id: str = Field(default=None, primary_key=True)
     bid: float = Field(default=None)
     email: str = Field(default=None, index=True)
-    time_placed: str = Field(default=None)
+    time_placed: datetime = Field(
+        default=None, sa_column=SAColumn("time_placed", SADateTime(timezone=True))
+    )
 
     item_name: str = Field(default=None)
     item: "ItemInternal" = Relationship(
@@ -30,6 +51,10 @@ class BidInternal(SQLModel, table=True):
 
 class ItemInternal(SQLModel, table=True):
     __tablename__ = "items"
+    __table_args__ = (
+        SAIndex("ix_items_tags", "tags", postgresql_using="gin"),
+        SAIndex("ix_items_search_vector", "search_vector", postgresql_using="gin"),
+    )
 
     name: str = Field(default=None, primary_key=True)
     description: str = Field(default=None)
@@ -37,12 +62,44 @@ class ItemInternal(SQLModel, table=True):
     tags: List[str] = Field(default=None, sa_column=SAColumn("tags", SAArray(SAString)))
     image: str = Field(default=None)
     image_placeholder: Optional[str] = Field(default=None)
+    image_variants: Optional[List[dict]] = Field(
+        default=None, sa_column=SAColumn("image_variants", SAJSONB)
+    )
 
     winning_bid_id: Optional[str] = Field(default=None, foreign_key="bids.id")
     winning_bid: Optional[BidInternal] = Relationship(
         back_populates="item", sa_relationship_kwargs={"uselist": False}
     )
 
+    # Full-text search document, maintained by Postgres. See items_search_document.
+    search_vector: Optional[str] = Field(
+        default=None,
+        sa_column=SAColumn(
+            "search_vector",
+            SATSVector,
+            SAComputed("items_search_document(name, description, tags)", persisted=True),
+        ),
+    )
+
+
+# Generated columns may only call immutable functions, and array_to_string is merely
+# stable, so the search document is built by an immutable SQL function instead.
+SAEvent.listen(
+    ItemInternal.__table__,
+    "before_create",
+    SADDL(
+        """
+        CREATE OR REPLACE FUNCTION items_search_document(
+            name varchar, description varchar, tags varchar[]
+        ) RETURNS tsvector LANGUAGE sql IMMUTABLE AS $$
+            SELECT setweight(to_tsvector('english', coalesce(name, '')), 'A')
+                || setweight(to_tsvector('english', coalesce(array_to_string(tags, ' '), '')), 'B')
+                || setweight(to_tsvector('english', coalesce(description, '')), 'C')
+        $$
+        """
+    ),
+)
+
 
 class UserInternal(SQLModel, table=True):
     __tablename__ = "users"
@@ -53,6 +110,8 @@ class UserInternal(SQLModel, table=True):
     hashed_password: str = Field(default=None)
     enabled: bool = Field(default=True)
     admin: bool = Field(default=False)
+    # Bumped to revoke every token issued to the user so far.
+    token_version: int = Field(default=0)
 
 
 class FeatureFlag(SQLModel, table=True):
@@ -62,6 +121,84 @@ class FeatureFlag(SQLModel, table=True):
     value: bool = Field(default=False)
 
 
+# Auction analytics summaries, maintained by the bid statement in src.bidding.
+
+
+class ItemBidStats(SQLModel, table=True):
+    __tablename__ = "item_bid_stats"
+
+    item_name: str = Field(
+        default=None,
+        sa_column=SAColumn(
+            "item_name",
+            SAString,
+            SAForeignKey("items.name", ondelete="CASCADE"),
+            primary_key=True,
+        ),
+    )
+    bids: int = Field(default=0)
+    bidders: int = Field(default=0)
+    winning_bid: float = Field(default=None)
+
+
+class ItemBidMinute(SQLModel, table=True):
+    __tablename__ = "item_bid_minutes"
+    __table_args__ = (SAIndex("ix_item_bid_minutes_minute", "minute"),)
+
+    item_name: str = Field(
+        default=None,
+        sa_column=SAColumn(
+            "item_name",
+            SAString,
+            SAForeignKey("items.name", ondelete="CASCADE"),
+            primary_key=True,
+        ),
+    )
+    # Minutes since the epoch.
+    minute: int = Field(
+        default=None, sa_column=SAColumn("minute", SABigInteger, primary_key=True)
+    )
+    bids: int = Field(default=0)
+
+
+class Bidder(SQLModel, table=True):
+    __tablename__ = "bidders"
+
+    email: str = Field(default=None, primary_key=True)
+
+
+class ImageJob(SQLModel, table=True):
+    """Image processing jobs, see src.images."""
+
+    __tablename__ = "image_jobs"
+    __table_args__ = (SAIndex("ix_image_jobs_updated_at", "updated_at"),)
+
+    id: str = Field(default=None, primary_key=True)
+    item_name: str = Field(default=None, index=True)
+    status: str = Field(default=None)
+    error: Optional[str] = Field(default=None)
+    # notifications.WORKER_ID of the worker processing the job.
+    worker: str = Field(default=None)
+    created_at: datetime = Field(
+        default=None,
+        sa_column=SAColumn(
+            "created_at",
+            SADateTime(timezone=True),
+            nullable=False,
+            server_default=SAText("now()"),
+        ),
+    )
+    updated_at: datetime = Field(
+        default=None,
+        sa_column=SAColumn(
+            "updated_at",
+            SADateTime(timezone=True),
+            nullable=False,
+            server_default=SAText("now()"),
+        ),
+    )
+
+
 # ----- ----- ----- ----- -----
 # Bid Models
 # ----- ----- ----- ----- -----
@@ -76,6 +213,17 @@ class BidCreate(SQLModel, table=False):
     bid: float
 
 
+class BidHistoryEntry(SQLModel, table=False):
+    bid: float
+    time_placed: datetime
+
+
+class BidHistoryResponse(SQLModel, table=False):
+    bids: List[BidHistoryEntry]
+    # Pass as `cursor` to fetch older bids. None when there are no more bids.
+    next_cursor: Optional[str] = None
+
+
 class WinningBidExport(SQLModel, table=False):
     item_name: str
     winning_bid: float
@@ -88,6 +236,27 @@ class WinningBidsResponse(SQLModel, table=False):
     winning_bids: List[WinningBidExport]
 
 
+class BidsPerMinute(SQLModel, table=False):
+    minute: int  # Unix timestamp of the start of the minute
+    bids: int
+
+
+class ContestedItem(SQLModel, table=False):
+    item_name: str
+    bids: int
+    unique_bidders: int
+    winning_bid: float
+
+
+class AnalyticsResponse(SQLModel, table=False):
+    total_bids: int
+    total_raised: float
+    unique_bidders: int
+    items_with_bids: int
+    bids_per_minute: List[BidsPerMinute]
+    most_contested: List[ContestedItem]
+
+
 # ----- ----- ----- ----- -----
 # Item Models
 # ----- ----- ----- ----- -----
@@ -102,6 +271,29 @@ class ItemCreate(SQLModel, table=False):
     image_placeholder: Optional[str] = ""
 
 
+class ItemImportRow(SQLModel, table=False):
+    name: str
+    description: str
+    bid: float
+    tags: List[str] = []
+    image: str  # File name within the uploaded image archive
+
+    @validator("name")
+    def strip_name(cls, name):
+        # Remove any leading or trailing whitespace
+        name = name.strip()
+        if not name:
+            raise ValueError("Item name must not be empty.")
+        return name
+
+
+class ImageVariant(SQLModel, table=False):
+    url: str
+    format: str  # "webp" or "jpeg"
+    width: int
+    height: int
+
+
 class ItemExport(SQLModel, table=False):
     name: str = Field(default=None, primary_key=True, index=True)
     description: str
@@ -109,9 +301,17 @@ class ItemExport(SQLModel, table=False):
     tags: List[str]
     image: str
     image_placeholder: str
+    image_variants: List[ImageVariant] = []
     winning_bid: Optional[BidExport] = None
 
 
+class ImageJobExport(SQLModel, table=False):
+    id: str
+    item_name: str
+    status: str
+    error: Optional[str] = None
+
+
 # ----- ----- ----- ----- -----
 # User Models
 # ----- ----- ----- ----- -----
@@ -124,6 +324,10 @@ class UserCreate(SQLModel, table=False):
     password: str
 
 
+class UserRevoke(SQLModel, table=False):
+    email: str
+
+
 class UserExport(SQLModel, table=False):
     first_name: str
     last_name: str
@@ -138,6 +342,8 @@ class UserExport(SQLModel, table=False):
 
 class ItemList(SQLModel, table=False):
     items: List[ItemExport]
+    # Pass as `cursor` to fetch the next page. None when there are no more items.
+    next_cursor: Optional[str] = None
 
 
 class BidStatusExport(SQLModel, table=False):
@@ -0,0 +1,111 @@
+"""
+Cross-worker change notification over Postgres LISTEN/NOTIFY.
+
+Each worker holds a single dedicated asyncpg connection that LISTENs on every
+subscribed channel and dispatches payloads to in-process callbacks. Writers
+publish with notify_clause() inside their own transaction, so the notification
+is only delivered if the change commits, and then call listener.publish_local()
+to apply the change to their own worker immediately. Payloads are tagged with
+the publishing worker's id so that worker ignores its own NOTIFY echo, and every
+worker handles each change exactly once.
+"""
+
+import asyncio
+import logging
+import uuid
+from collections import defaultdict
+from typing import Callable, DefaultDict, List
+
+import asyncpg
+from sqlalchemy import text
+
+from src.database import database_url
+from src.settings import settings
+
+logger = logging.getLogger("api")
+
+RECONNECT_DELAY = 5  # Seconds
+
+WORKER_ID = uuid.uuid4().hex
+
+
+def envelope(payload: str) -> str:
+    """Tags payload with this worker's id, for use as a raw pg_notify payload."""
+    return f"{WORKER_ID}:{payload}"
+
+
+def notify_clause(channel: str, payload: str):
+    """Returns a statement that publishes payload on channel when the transaction commits."""
+    return text("SELECT pg_notify(:channel, :payload)").bindparams(
+        channel=channel, payload=envelope(payload)
+    )
+
+
+class PostgresListener:
+    def __init__(self):
+        self._callbacks: DefaultDict[str, List[Callable[[str], None]]] = defaultdict(
+            list
+        )
+        self._task = None
+
+    def subscribe(self, channel: str, callback: Callable[[str], None]) -> None:
+        """Registers callback(payload) for channel. Must be called before start()."""
+        self._callbacks[channel].append(callback)
+
+    async def start(self) -> None:
+        if not settings.DATABASE_LISTEN_ENABLED or self._task is not None:
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def publish_local(self, channel: str, payload: str) -> None:
+        """
+        Delivers payload to this worker's callbacks. Call once the change has committed;
+        other workers receive it over NOTIFY.
+        """
+        self._dispatch(channel, payload)
+
+    def _on_notification(self, connection, pid, channel, raw_payload):
+        origin, _, payload = raw_payload.partition(":")
+        if origin == WORKER_ID:
+            return  # Already delivered by publish_local.
+        self._dispatch(channel, payload)
+
+    def _dispatch(self, channel, payload):
+        for callback in self._callbacks[channel]:
+            try:
+                callback(payload)
+            except Exception:
+                logger.exception(f"Notification handler for [{channel}] failed")
+
+    async def _run(self):
+        dsn = settings.DATABASE_LISTEN_URL or database_url()
+        while True:
+            connection = None
+            try:
+                connection = await asyncpg.connect(dsn)
+                closed = asyncio.Event()
+                connection.add_termination_listener(lambda _: closed.set())
+                for channel in self._callbacks:
+                    await connection.add_listener(channel, self._on_notification)
+                await closed.wait()
+                logger.warning("Notification listener connection lost, reconnecting")
+            except asyncio.CancelledError:
+                raise
+            except Exception as err:
+                logger.warning(f"Notification listener unavailable: {err}")
+            finally:
+                if connection is not None and not connection.is_closed():
+                    await connection.close()
+            await asyncio.sleep(RECONNECT_DELAY)
+
+
+listener = PostgresListener()
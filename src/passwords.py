@@ -0,0 +1,70 @@
+"""
+Password hashing on a dedicated, bounded executor.
+
+bcrypt is deliberately slow, so hashing runs on its own small thread pool
+instead of the request threadpool or the event loop. At most
+PASSWORD_HASH_QUEUE_LIMIT hashes may be queued or running at once; beyond that,
+auth requests are turned away with a 503 so that a login burst cannot starve
+bidding traffic.
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+from passlib.context import CryptContext
+
+from src.exceptions import auth_overloaded_exception
+from src.settings import settings
+
+# Hashes made with a different bcrypt cost are flagged by needs_update and
+# transparently rehashed on the next successful login.
+password_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=settings.PASSWORD_HASH_ROUNDS,
+)
+
+
+class PasswordHasher:
+    def __init__(self):
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending = 0
+
+    async def _run(self, function, *args):
+        # Only touched from the event loop, so the counter needs no lock.
+        if self._pending >= settings.PASSWORD_HASH_QUEUE_LIMIT:
+            raise auth_overloaded_exception
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=settings.PASSWORD_HASH_WORKERS,
+                thread_name_prefix="password-hash",
+            )
+
+        self._pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                self._executor, function, *args
+            )
+        finally:
+            self._pending -= 1
+
+    async def hash(self, plaintext: str) -> str:
+        return await self._run(password_context.hash, plaintext)
+
+    async def verify_and_update(
+        self, plaintext: str, hashed: str
+    ) -> Tuple[bool, Optional[str]]:
+        """
+        Checks plaintext against hashed. Returns (valid, new_hash), where new_hash is set
+        when the stored hash used outdated settings and should be replaced.
+        """
+        return await self._run(password_context.verify_and_update, plaintext, hashed)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+password_hasher = PasswordHasher()
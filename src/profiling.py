@@ -0,0 +1,141 @@
+"""
+Opt-in per-request SQL profiling (SQL_PROFILING_ENABLED).
+
+Builds on the statement timings recorded by the engine events in src.metrics:
+each request's statements are grouped by their SQL text (parameters are bound
+separately, so one query shape is one key). A statement executed
+SQL_REPEATED_STATEMENT_THRESHOLD or more times in one request is flagged as a
+probable N+1 load.
+
+Every response carries X-DB-Query-Count, X-DB-Time-Ms, X-DB-Repeated-Statements
+and a Server-Timing entry, measured when the response starts. Requests with a
+slow statement, too much DB time or a repeated statement are written to the
+"api.sql" logger as one JSON line, counted through the end of the request.
+"""
+
+import json
+import logging
+import time
+from typing import Dict, List, Tuple
+
+from src.metrics import RequestStats, request_stats, route_label
+from src.settings import settings
+
+logger = logging.getLogger("api.sql")
+
+MAX_LOGGED_STATEMENT_LENGTH = 500
+
+
+class ProfiledRequestStats(RequestStats):
+    """RequestStats that also keeps per-statement counts and slow statements."""
+
+    __slots__ = ("statements", "slow_queries")
+
+    def __init__(self):
+        super().__init__()
+        self.statements: Dict[str, List] = {}
+        self.slow_queries: List[Tuple[str, float]] = []
+
+    def record_query(self, statement: str, duration: float) -> None:
+        super().record_query(statement, duration)
+        entry = self.statements.get(statement)
+        if entry is None:
+            self.statements[statement] = [1, duration]
+        else:
+            entry[0] += 1
+            entry[1] += duration
+        if duration >= settings.SQL_SLOW_QUERY_THRESHOLD:
+            self.slow_queries.append((statement, duration))
+
+    def repeated_statements(self) -> List[Tuple[str, int, float]]:
+        """Statements executed often enough to look like an N+1 load, most frequent first."""
+        repeated = [
+            (statement, count, total)
+            for statement, (count, total) in self.statements.items()
+            if count >= settings.SQL_REPEATED_STATEMENT_THRESHOLD
+        ]
+        return sorted(repeated, key=lambda entry: entry[1], reverse=True)
+
+
+def _shorten(statement: str) -> str:
+    statement = " ".join(statement.split())
+    if len(statement) > MAX_LOGGED_STATEMENT_LENGTH:
+        return statement[:MAX_LOGGED_STATEMENT_LENGTH] + "..."
+    return statement
+
+
+def _debug_headers(stats: ProfiledRequestStats) -> List[Tuple[bytes, bytes]]:
+    db_time_ms = stats.query_time * 1000
+    return [
+        (b"x-db-query-count", str(stats.query_count).encode()),
+        (b"x-db-time-ms", f"{db_time_ms:.2f}".encode()),
+        (b"x-db-repeated-statements", str(len(stats.repeated_statements())).encode()),
+        (b"server-timing", f"db;dur={db_time_ms:.2f}".encode()),
+    ]
+
+
+def log_profile(scope, status: int, duration: float, stats: ProfiledRequestStats) -> None:
+    """Writes a structured log record if the request crossed any profiling threshold."""
+    repeated = stats.repeated_statements()
+    if not (
+        stats.slow_queries
+        or repeated
+        or stats.query_time >= settings.SQL_SLOW_REQUEST_THRESHOLD
+    ):
+        return
+
+    record = {
+        "event": "sql_profile",
+        "method": scope["method"],
+        "route": route_label(scope),
+        "path": scope["path"],
+        "status": status,
+        "duration_ms": round(duration * 1000, 2),
+        "query_count": stats.query_count,
+        "db_time_ms": round(stats.query_time * 1000, 2),
+        "slow_queries": [
+            {"statement": _shorten(statement), "duration_ms": round(elapsed * 1000, 2)}
+            for statement, elapsed in stats.slow_queries
+        ],
+        "repeated_statements": [
+            {
+                "statement": _shorten(statement),
+                "count": count,
+                "db_time_ms": round(total * 1000, 2),
+            }
+            for statement, count, total in repeated
+        ],
+    }
+    logger.warning(json.dumps(record))
+
+
+class SQLProfilingMiddleware:
+    """
+    Pure ASGI middleware profiling the SQL issued by each request. Must wrap
+    MetricsMiddleware (be added after it) so both share the request's stats.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        stats = ProfiledRequestStats()
+        token = request_stats.set(stats)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_headers(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = list(message.get("headers", [])) + _debug_headers(stats)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_headers)
+        finally:
+            request_stats.reset(token)
+            log_profile(scope, status, time.perf_counter() - start, stats)
@@ -0,0 +1,43 @@
+"""
+Read queries shared by the routers that project rows straight into export models,
+so serializing a list of items never lazy-loads relationships row by row.
+"""
+
+from sqlmodel import select
+
+from src.models import BidInternal, ItemInternal
+
+
+def item_export_query():
+    """
+    Selects every ItemExport field plus the current winning bid's amount and bidder in
+    one LEFT JOIN. Add filters and ordering to the returned statement as needed.
+    """
+    return select(
+        ItemInternal.name,
+        ItemInternal.description,
+        ItemInternal.original_bid,
+        ItemInternal.tags,
+        ItemInternal.image,
+        ItemInternal.image_placeholder,
+        ItemInternal.image_variants,
+        BidInternal.bid.label("winning_bid"),
+        BidInternal.email.label("winning_email"),
+    ).outerjoin(BidInternal, BidInternal.id == ItemInternal.winning_bid_id)
+
+
+def item_export_dict(row) -> dict:
+    """
+    Maps a row from item_export_query() to a dict shaped like ItemExport. Rows come
+    straight from the database, so they are encoded as-is without model validation.
+    """
+    return {
+        "name": row.name,
+        "description": row.description,
+        "original_bid": row.original_bid,
+        "tags": row.tags,
+        "image": row.image,
+        "image_placeholder": row.image_placeholder,
+        "image_variants": row.image_variants or [],
+        "winning_bid": {"bid": row.winning_bid} if row.winning_bid is not None else None,
+    }
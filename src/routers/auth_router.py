@@ -7,12 +7,18 @@ from fastapi.requests import Request
 from fastapi.security import OAuth2PasswordRequestForm
 from fastapi_login import LoginManager
 from fastapi_login.exceptions import InvalidCredentialsException
+import jwt
 from starlette.status import HTTP_400_BAD_REQUEST, HTTP_401_UNAUTHORIZED
 from sqlalchemy.exc import IntegrityError
 
-from src.models import UserInternal, UserCreate, UserExport
+from src.cache import TTLCache
+from src.models import UserInternal, UserCreate, UserExport, UserRevoke
 from src.settings import settings
-from src.database import get_session, session_dep
+from src.database import async_session_dep, get_async_session
+from src.passwords import password_hasher
+from src.tokens import revoke_user_tokens, token_versions
+from sqlalchemy import update
+from sqlmodel import select
 
 manager = LoginManager(settings.auth_secret, token_url="/auth/token")
 
@@ -20,29 +26,101 @@ auth_router = APIRouter()
 
 logger = logging.Logger("Authentication")
 
+# Authenticated users keyed by email. Changes made by other workers (or directly in
+# the database) become visible once the entry expires after USER_CACHE_TTL seconds.
+user_cache = TTLCache(maxsize=settings.USER_CACHE_SIZE, ttl=settings.USER_CACHE_TTL)
 
-def hash_password(plaintext: str):
-    return manager.pwd_context.hash(plaintext)
 
+def invalidate_user(email: str) -> None:
+    """Drops a cached user. Call whenever a user is created, enabled/disabled or promoted."""
+    user_cache.invalidate(email)
 
-def verify_password(plaintext: str, hashed: str):
-    return manager.pwd_context.verify(plaintext, hashed)
+
+async def hash_password(plaintext: str) -> str:
+    return await password_hasher.hash(plaintext)
 
 
 @manager.user_loader()
-def load_user(email: str):
+async def load_user(email: str):
+    user = user_cache.get(email)
+    if user is not None:
+        return user
+
+    session = get_async_session()
     try:
-        session = get_session()
-        user = session.query(UserInternal).filter(UserInternal.email == email).first()
+        result = await session.execute(
+            select(UserInternal).where(UserInternal.email == email)
+        )
+        user = result.scalars().first()
     finally:
-        session.close()
+        await session.close()
+
+    if user is not None:
+        user_cache.set(email, user)
     return user
 
 
-def is_user(request: Request):
-    raw_user_data = request.state.user
-    if request.state.user:
-        user = UserInternal.parse_obj(raw_user_data)
+def bearer_token(request: Request):
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    return token
+
+
+def token_claims(user: UserInternal) -> dict:
+    # The loaded user may be cached from before a revocation on another worker.
+    token_version = max(user.token_version or 0, token_versions.version(user.email))
+    claims = dict(sub=user.email, tv=token_version)
+    if settings.AUTH_CLAIMS_TOKENS:
+        claims.update(
+            first_name=user.first_name,
+            last_name=user.last_name,
+            admin=user.admin,
+            enabled=user.enabled,
+        )
+    return claims
+
+
+async def current_user(request: Request):
+    """
+    Resolves the user from the request's bearer token, or None. Only runs for routes
+    that depend on is_user, so public routes do no authentication work at all.
+    Tokens carrying user claims are trusted without a lookup; others are resolved
+    through the cached user loader. Disabled users are rejected either way.
+    """
+    token = bearer_token(request)
+    if not token:
+        return None
+    try:
+        payload = jwt.decode(token, settings.auth_secret, algorithms=[manager.algorithm])
+    except jwt.PyJWTError:
+        return None
+
+    email = payload.get("sub")
+    if not email or token_versions.is_revoked(email, payload.get("tv", 0)):
+        return None
+
+    if "admin" in payload:
+        if not payload.get("enabled", True):
+            return None
+        return UserInternal(
+            email=email,
+            first_name=payload.get("first_name"),
+            last_name=payload.get("last_name"),
+            admin=payload["admin"],
+            enabled=True,
+            token_version=payload.get("tv", 0),
+        )
+
+    user = await load_user(email)
+    if user is None or not user.enabled:
+        return None
+    return user
+
+
+async def is_user(request: Request):
+    user = await current_user(request)
+    if user:
         return user
 
     raise HTTPException(
@@ -52,7 +130,7 @@ def is_user(request: Request):
     )
 
 
-def is_admin(user: UserInternal = Depends(is_user)):
+async def is_admin(user: UserInternal = Depends(is_user)):
     if not user.admin:
         raise HTTPException(
             status_code=HTTP_401_UNAUTHORIZED,
@@ -63,17 +141,33 @@ def is_admin(user: UserInternal = Depends(is_user)):
 
 
 @auth_router.post("/token")
-def login(data: OAuth2PasswordRequestForm = Depends()):
+async def login(
+    data: OAuth2PasswordRequestForm = Depends(), session=Depends(async_session_dep)
+):
     email = data.username
-    user = load_user(email)
+    user = await load_user(email)
     if not user:
         logger.info(f"User [{email}] has unsuccessfully attempted a login.")
         raise InvalidCredentialsException
-    elif not verify_password(data.password, user.hashed_password):
+
+    valid, new_hash = await password_hasher.verify_and_update(
+        data.password, user.hashed_password
+    )
+    if not valid:
         raise InvalidCredentialsException
 
+    if new_hash:
+        # The stored hash predates the current PASSWORD_HASH_ROUNDS.
+        await session.execute(
+            update(UserInternal)
+            .where(UserInternal.email == email)
+            .values(hashed_password=new_hash)
+        )
+        await session.commit()
+        invalidate_user(email)
+
     access_token = manager.create_access_token(
-        data=dict(sub=email), expires=timedelta(days=7)
+        data=token_claims(user), expires=timedelta(days=7)
     )
     logger.info(
         f"User [{user.first_name}, {user.last_name}, {user.email}] has logged in successfully."
@@ -82,23 +176,25 @@ def login(data: OAuth2PasswordRequestForm = Depends()):
 
 
 @auth_router.post("/register", status_code=201)
-def register(user_create: UserCreate, session=Depends(session_dep)):
+async def register(user_create: UserCreate, session=Depends(async_session_dep)):
     user: UserInternal = UserInternal(
         first_name=user_create.first_name,
         last_name=user_create.last_name,
         email=user_create.email,
-        hashed_password=hash_password(user_create.password),
+        hashed_password=await hash_password(user_create.password),
         enabled=True,
         admin=False,
     )
 
     try:
         session.add(user)
-        session.commit()
+        await session.commit()
+        invalidate_user(user.email)
         logger.info(
             f"User [{user.first_name}, {user.last_name}, {user.email}] has registered a new account."
         )
     except IntegrityError:
+        await session.rollback()
         logger.info(
             f"User [{user.email}] has failed to register a new account due to email conflict."
         )
@@ -111,6 +207,25 @@ def register(user_create: UserCreate, session=Depends(session_dep)):
     return {"detail": "New user account successfully created!"}
 
 
+@auth_router.post("/revoke")
+async def revoke_tokens(
+    user_revoke: UserRevoke,
+    user: UserInternal = Depends(is_admin),
+    session=Depends(async_session_dep),
+):
+    """Signs a user out everywhere by revoking every token issued to them so far."""
+    if not await revoke_user_tokens(user_revoke.email, session):
+        raise HTTPException(
+            status_code=HTTP_400_BAD_REQUEST,
+            detail="No user with that email address is registered.",
+        )
+    invalidate_user(user_revoke.email)
+    logger.info(
+        f"Tokens of user [{user_revoke.email}] revoked by admin [{user.first_name} {user.last_name}]"
+    )
+    return {"detail": "User tokens successfully revoked."}
+
+
 @auth_router.get("/profile")
 def profile(user: UserInternal = Depends(is_user)):
     return UserExport(**user.dict())
@@ -1,43 +1,51 @@
+import base64
 import logging
 from datetime import datetime
-import uuid
-from src.database import session_dep
-
-from fastapi import APIRouter, Depends
-from pytz import timezone
-
-from src.exceptions import (
-    bid_below_current_exception,
-    bid_below_starting_exception,
-    bid_increment_too_small_exception,
-    bidding_disabled_exception,
-    item_not_found_exception,
-)
+from typing import List, Union
+from src.database import async_session_dep, session_dep
+
+from fastapi import APIRouter, Depends, Query
+from fastapi.requests import Request
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
+import orjson
+from sqlalchemy import tuple_
+from sqlmodel import select
+
+from src.analytics import auction_analytics
+from src.bid_status import bid_status_cache
+from src.bidding import commit_bid
+from src.exports import export_winners_csv, export_winners_ndjson
+from src.exceptions import bid_history_cursor_invalid_exception, bidding_disabled_exception
 from src.helpers import (
     is_bidding_enabled,
     set_bidding_enabled,
 )
+from src.metrics import bid_outcomes
 from src.models import (
     ItemInternal,
     SetBiddingMode,
     UserInternal,
+    AnalyticsResponse,
     BidCreate,
     BidInternal,
     BidStatusExport,
     BidDeltaResponse,
-    WinningBidExport,
+    BidHistoryEntry,
+    BidHistoryResponse,
     WinningBidsResponse,
 )
+from src.queries import item_export_dict, item_export_query
 from src.routers.auth_router import is_admin, is_user
 from src.settings import settings
+from src.stream import bid_stream
 
 bid_router = APIRouter()
 logger = logging.Logger("Bids")
 
 
 @bid_router.get("/enabled")
-def get_bidding_status(session=Depends(session_dep)):
-    return {"bidding_enabled": is_bidding_enabled(session)}
+async def get_bidding_status():
+    return {"bidding_enabled": is_bidding_enabled()}
 
 
 @bid_router.post("/enabled")
@@ -60,92 +68,135 @@ def get_bid_delta():
 
 
 @bid_router.get("/user", response_model=BidStatusExport)
-def get_winning_bids(
-    user: UserInternal = Depends(is_user), session=Depends(session_dep)
+async def get_winning_bids(
+    user: UserInternal = Depends(is_user), session=Depends(async_session_dep)
 ):
     """Gets the list of all items in which the current user has bid on."""
+    cached = bid_status_cache.get(user.email)
+    if cached is not None:
+        return Response(content=cached, media_type="application/json")
+    generation = bid_status_cache.generation
+
     winning_bid_items = []
     losing_bid_items = []
 
-    all_item_ids = (
-        session.query(BidInternal)
-        .distinct(BidInternal.item_name)
-        .filter(BidInternal.email == user.email)
-        .all()
+    # Served by ix_bids_email_item_name as an index-only scan.
+    user_item_names = select(BidInternal.item_name).where(
+        BidInternal.email == user.email
     )
 
-    user_items = (
-        session.query(ItemInternal)
-        .filter(ItemInternal.name.in_([item.item_name for item in all_item_ids]))
-        .all()
+    result = await session.execute(
+        item_export_query().where(ItemInternal.name.in_(user_item_names))
     )
 
-    for item in user_items:
-        if item.winning_bid and item.winning_bid.email == user.email:
-            winning_bid_items.append(item)
+    rows = result.all()
+    for row in rows:
+        if row.winning_email == user.email:
+            winning_bid_items.append(item_export_dict(row))
         else:
-            losing_bid_items.append(item)
-    return BidStatusExport(winning_bids=winning_bid_items, losing_bids=losing_bid_items)
+            losing_bid_items.append(item_export_dict(row))
+
+    body = orjson.dumps(
+        {"winning_bids": winning_bid_items, "losing_bids": losing_bid_items}
+    )
+    bid_status_cache.set(user.email, body, (row.name for row in rows), generation)
+    return Response(content=body, media_type="application/json")
 
 
 @bid_router.post("/bid")
-def place_bid(
+async def place_bid(
     bid_create: BidCreate,
     user: UserInternal = Depends(is_user),
-    session=Depends(session_dep),
+    session=Depends(async_session_dep),
 ):
 
-    if not is_bidding_enabled(session):
+    if not is_bidding_enabled():
+        bid_outcomes.labels("bidding_disabled").inc()
         raise bidding_disabled_exception
 
-    bid_item = (
-        session.query(ItemInternal)
-        .filter(ItemInternal.name == bid_create.item_name)
-        .first()
+    await commit_bid(session, bid_create.item_name, bid_create.bid, user.email)
+
+    logger.info(
+        f"Bid placed on [{bid_create.item_name}] for [${bid_create.bid}] by [{user.first_name} {user.last_name}, {user.email}]"
     )
+    return {"detail": "Your bid has been successfully placed!"}
 
-    if not bid_item:
-        raise item_not_found_exception
 
-    current_winning_bid_exists = bid_item.winning_bid_id is not None
+def encode_history_cursor(bid: BidInternal) -> str:
+    raw = f"{bid.time_placed.isoformat()}|{bid.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
 
-    if (
-        not current_winning_bid_exists
-    ):  # If this is first bid, don't enforce delta and make equality < instead of <=
-        if bid_create.bid < bid_item.original_bid:
-            raise bid_below_starting_exception
 
-    else:  # If not the first bid, additional bidding restrictions
-        if bid_create.bid <= bid_item.winning_bid.bid:
-            raise bid_below_current_exception
+def decode_history_cursor(cursor: str):
+    try:
+        time_placed, bid_id = base64.urlsafe_b64decode(cursor).decode().split("|", 1)
+        return datetime.fromisoformat(time_placed), bid_id
+    except ValueError:
+        raise bid_history_cursor_invalid_exception
 
-        if (
-            bid_create.bid - bid_item.winning_bid.bid < settings.minimum_bid_increment
-        ):  # Enforce minimum bid delta
-            raise bid_increment_too_small_exception
 
-    tz = timezone("EST")
-    current_time = datetime.now(tz)
+@bid_router.get("/history", response_model=BidHistoryResponse)
+async def get_bid_history(
+    item_name: str,
+    limit: int = Query(default=50, ge=1, le=500),
+    cursor: Union[str, None] = None,
+    session=Depends(async_session_dep),
+):
+    """
+    Lists the bids placed on an item, newest first. Pass the response's `next_cursor`
+    as `cursor` to fetch the next page of older bids.
+    """
+    query = (
+        select(BidInternal)
+        .where(BidInternal.item_name == item_name)
+        .order_by(BidInternal.time_placed.desc(), BidInternal.id.desc())
+        .limit(limit + 1)
+    )
+    if cursor is not None:
+        query = query.where(
+            tuple_(BidInternal.time_placed, BidInternal.id)
+            < tuple_(*decode_history_cursor(cursor))
+        )
 
-    bid_for_db = BidInternal(
-        id=str(uuid.uuid4()),
-        item_name=bid_create.item_name,
-        item=bid_item,
-        bid=bid_create.bid,
-        email=user.email,
-        time_placed=str(current_time),
+    bids = (await session.execute(query)).scalars().all()
+    next_cursor = None
+    if len(bids) > limit:
+        bids = bids[:limit]
+        next_cursor = encode_history_cursor(bids[-1])
+
+    return BidHistoryResponse(
+        bids=[BidHistoryEntry(bid=bid.bid, time_placed=bid.time_placed) for bid in bids],
+        next_cursor=next_cursor,
     )
 
-    bid_item.winning_bid_id = bid_for_db.id
 
-    session.add(bid_item)
-    session.add(bid_for_db)
-    session.commit()
+@bid_router.get("/analytics", response_model=AnalyticsResponse)
+async def get_auction_analytics(
+    top: int = Query(default=10, ge=1, le=100),
+    user: UserInternal = Depends(is_admin),
+    session=Depends(async_session_dep),
+):
+    """
+    Live auction totals, read from the bid summary tables and cached for
+    ANALYTICS_CACHE_TTL seconds.
+    """
+    return await auction_analytics(session, top)
 
-    logger.info(
-        f"Bid placed on [{bid_item.name}] for [${bid_create.bid}] by [{user.first_name} {user.last_name}, {user.email}]"
+
+@bid_router.get("/stream")
+async def stream_bids(
+    request: Request, items: Union[List[str], None] = Query(default=None)
+):
+    """
+    Server-Sent Events stream of live auction updates. Emits `bid` events with
+    {item_name, winning_bid} for every new winning bid (only for the given `items`, if
+    any) and `bidding_enabled` events whenever bidding is enabled or disabled.
+    """
+    return StreamingResponse(
+        bid_stream.events(request, items),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
-    return {"detail": "Your bid has been successfully placed!"}
 
 
 @bid_router.get("/winner", response_model=WinningBidsResponse)
@@ -167,13 +218,35 @@ def get_winning_bids(
 
     for row in winning_bids_query:
         winning_bids.append(
-            WinningBidExport(
-                item_name=row.BidInternal.item_name,
-                winning_bid=row.BidInternal.bid,
-                email=row.BidInternal.email,
-                first_name=row.UserInternal.first_name,
-                last_name=row.UserInternal.last_name,
-            )
+            {
+                "item_name": row.BidInternal.item_name,
+                "winning_bid": row.BidInternal.bid,
+                "email": row.BidInternal.email,
+                "first_name": row.UserInternal.first_name,
+                "last_name": row.UserInternal.last_name,
+            }
         )
 
-    return WinningBidsResponse(winning_bids=winning_bids)
+    # Trusted rows: encode directly instead of revalidating against WinningBidsResponse.
+    return ORJSONResponse({"winning_bids": winning_bids})
+
+
+@bid_router.get("/winner/export")
+def export_winning_bids(
+    format: str = Query(default="csv", regex="^(csv|ndjson)$"),
+    group_by_winner: bool = False,
+    user: UserInternal = Depends(is_admin),
+):
+    """
+    Streams every winning bid as CSV or newline-delimited JSON. With `group_by_winner`,
+    emits one record per winner with their items and invoice total.
+    """
+    if format == "csv":
+        return StreamingResponse(
+            export_winners_csv(group_by_winner),
+            media_type="text/csv",
+            headers={"Content-Disposition": 'attachment; filename="winners.csv"'},
+        )
+    return StreamingResponse(
+        export_winners_ndjson(group_by_winner), media_type="application/x-ndjson"
+    )
@@ -1,20 +1,34 @@
-import io
 import logging
+import re
+import shutil
+import tempfile
+import zipfile
 from typing import List, Union
-from src.database import session_dep
-
-from fastapi import APIRouter, Depends, UploadFile, Form, File
-import blurhash
+from src.database import async_session_dep, session_dep
 
+from fastapi import APIRouter, Depends, UploadFile, Form, File, Header, Query
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
+from sqlalchemy import func, literal_column
 
+from src.catalog import catalog, etag_matches, item_changed, notify_item_changed
+from src.compression import accepts_gzip, gzip_etag
 from src.exceptions import (
     item_name_conflict_exception,
     item_not_found_exception,
+    image_job_not_found_exception,
+    import_archive_invalid_exception,
+    import_manifest_invalid_exception,
     item_update_bid_conflict_exception,
 )
-from src.helpers import s3_client
+from src.images import (
+    image_digest,
+    image_jobs,
+    release_item_images,
+)
+from src.importer import ManifestError, import_items, parse_manifest
 from src.models import (
     BidInternal,
+    ImageJobExport,
     ItemInternal,
     ItemExport,
     ItemInternal,
@@ -22,57 +36,115 @@ from src.models import (
     UserInternal,
     UserInternal,
 )
+from src.queries import item_export_dict, item_export_query
 from src.routers.auth_router import is_admin
-from src.settings import settings
-from PIL import Image
-from PIL.ImageOps import exif_transpose
 
 item_router = APIRouter()
 logger = logging.Logger("Items")
 
 
-def update_item_image(item_name: str, image_file: str):
+@item_router.get("/items", response_model=ItemList)
+async def get_all_items(
+    limit: Union[int, None] = Query(default=None, ge=1, le=500),
+    cursor: Union[str, None] = None,
+    tags_any: Union[List[str], None] = Query(default=None),
+    tags_all: Union[List[str], None] = Query(default=None),
+    if_none_match: Union[str, None] = Header(default=None),
+    accept_encoding: Union[str, None] = Header(default=None),
+    session=Depends(async_session_dep),
+):
+    """
+    Lists auction items ordered by name. Without parameters the whole catalog is
+    returned from the cached snapshot. With `limit`, items are returned a page at a
+    time; pass the response's `next_cursor` as `cursor` to fetch the next page.
+    `tags_any` / `tags_all` keep items having at least one / all of the given tags.
+    """
+    if limit or cursor or tags_any or tags_all:
+        return await get_item_page(session, limit, cursor, tags_any, tags_all)
+
+    body, gzipped, etag = await catalog.get()
+    gzip = accepts_gzip(accept_encoding)
+    if gzip:
+        etag = gzip_etag(etag)
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    if gzip:
+        headers["Content-Encoding"] = "gzip"
+        return Response(content=gzipped, media_type="application/json", headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+async def get_item_page(session, limit, cursor, tags_any, tags_all) -> Response:
+    query = item_export_query().order_by(ItemInternal.name)
+    if cursor is not None:
+        query = query.where(ItemInternal.name > cursor)
+    if tags_any:
+        query = query.where(ItemInternal.tags.overlap(tags_any))
+    if tags_all:
+        query = query.where(ItemInternal.tags.contains(tags_all))
+    if limit:
+        # Fetch one extra row to learn whether another page follows.
+        query = query.limit(limit + 1)
+
+    rows = (await session.execute(query)).all()
+    next_cursor = None
+    if limit and len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = rows[-1].name
+
+    # The rows are trusted, so they're encoded directly rather than revalidated against
+    # the route's response_model, which only documents the shape.
+    return ORJSONResponse(
+        {"items": [item_export_dict(row) for row in rows], "next_cursor": next_cursor}
+    )
 
-    # Downscale Image
-    raw_image = Image.open(image_file)
-    file_extension = raw_image.format
-    image = exif_transpose(raw_image)
-    image.thumbnail((512, 512), Image.ANTIALIAS)
 
-    compressed_image_file = io.BytesIO()
-    image.save(compressed_image_file, format=file_extension)
-    compressed_image_file.seek(0)
+def search_tsquery(text: str) -> str:
+    """
+    Builds a to_tsquery expression requiring every word of text, matching each word as
+    a prefix so results update as the user types. Punctuation is dropped, so user input
+    can never produce invalid tsquery syntax.
+    """
+    words = re.findall(r"\w+", text)
+    return " & ".join(f"{word}:*" for word in words)
 
-    # Blurhash Image Thumbnail
-    image_placeholder = blurhash.encode(compressed_image_file, 4, 3)
-    compressed_image_file.seek(0)
 
-    # Upload Image to S3
-    s3_client.upload_fileobj(
-        compressed_image_file,
-        settings.AWS_IMAGE_BUCKET_NAME,
-        f"{item_name}.{file_extension}",
-        ExtraArgs={"ContentType": "image/jpeg"},
+@item_router.get("/search", response_model=ItemList)
+async def search_items(
+    q: str,
+    limit: int = Query(default=20, ge=1, le=100),
+    session=Depends(async_session_dep),
+):
+    """Full-text search over item names, tags and descriptions, best matches first."""
+    tsquery = search_tsquery(q)
+    if not tsquery:
+        return ORJSONResponse({"items": [], "next_cursor": None})
+
+    # asyncpg binds strings as varchar, which to_tsquery won't take as a regconfig.
+    query = func.to_tsquery(literal_column("'english'::regconfig"), tsquery)
+    rank = func.ts_rank(ItemInternal.search_vector, query)
+    result = await session.execute(
+        item_export_query()
+        .where(ItemInternal.search_vector.op("@@")(query))
+        .order_by(rank.desc(), ItemInternal.name)
+        .limit(limit)
+    )
+    return ORJSONResponse(
+        {"items": [item_export_dict(row) for row in result.all()], "next_cursor": None}
     )
-
-    # Generate Image URL
-    image_url = f"https://{settings.AWS_IMAGE_BUCKET_NAME}.s3.us-east-1.amazonaws.com/{item_name}.{file_extension}"
-    return image_url, image_placeholder
-
-
-@item_router.get("/items", response_model=ItemList)
-def get_all_items(session=Depends(session_dep)):
-    db_items = session.query(ItemInternal).order_by(ItemInternal.name).all()
-    return ItemList(items=db_items)
 
 
 @item_router.get("/item", response_model=ItemExport)
-def get_item_by_name(item_name: str, session=Depends(session_dep)):
-    db_item = session.query(ItemInternal).filter(ItemInternal.name == item_name).first()
-    if not db_item:
+async def get_item_by_name(item_name: str, session=Depends(async_session_dep)):
+    result = await session.execute(
+        item_export_query().where(ItemInternal.name == item_name)
+    )
+    row = result.first()
+    if not row:
         raise item_not_found_exception
 
-    return db_item
+    return ORJSONResponse(item_export_dict(row))
 
 
 @item_router.post("/item")
@@ -92,22 +164,25 @@ def add_auction_item(
     if session.query(ItemInternal).filter_by(name=name).first():
         raise item_name_conflict_exception
 
-    image_url, image_placeholder = update_item_image(name, image.file)
-
+    # The image and placeholder are filled in by the image job once it finishes.
     item_to_add = ItemInternal(
         name=name,
         description=description,
         original_bid=bid,
         tags=tags,
-        image=image_url,
-        image_placeholder=image_placeholder,
+        image="",
+        image_placeholder="",
     )
 
     session.add(item_to_add)
+    notify_item_changed(session, name)
     session.commit()
+    item_changed(name)
+
+    image_job = image_jobs.submit(name, image.file.read())
 
     logger.info(f"Item [{name}] created by admin [{user.first_name} {user.last_name}]")
-    return {"detail": "Successfully added item to database"}
+    return {"detail": "Successfully added item to database", "image_job": image_job}
 
 
 @item_router.put("/item")
@@ -130,20 +205,25 @@ def update_auction_item(
     if existing_item.winning_bid and bid != existing_item.original_bid:
         raise item_update_bid_conflict_exception
 
-    if image:
-        image_url, image_placeholder = update_item_image(name, image.file)
-        existing_item.image = image_url
-        existing_item.image_placeholder = image_placeholder
-
     existing_item.description = description
     existing_item.original_bid = bid
     existing_item.tags = tags
 
+    notify_item_changed(session, name)
     session.commit()
+    item_changed(name)
+
+    # The current image is kept until the new one has been processed. Re-submitting
+    # the item's current image file is skipped entirely.
+    image_job = None
+    if image:
+        image_data = image.file.read()
+        if image_jobs.digest_for_url(existing_item.image) != image_digest(image_data):
+            image_job = image_jobs.submit(name, image_data)
 
     logger.info(f"Item [{name}] updated by admin [{user.first_name} {user.last_name}]")
 
-    return {"detail": "Successfully updated item"}
+    return {"detail": "Successfully updated item", "image_job": image_job}
 
 
 @item_router.delete("/item")
@@ -155,19 +235,61 @@ def remove_auction_item(
     if not item:
         raise item_not_found_exception
 
+    item_image = item.image
     item_bids = session.query(BidInternal).filter_by(item_name=item_name).all()
     for bid in item_bids:
         session.delete(bid)
 
     session.delete(item)
+    notify_item_changed(session, item_name)
     session.commit()
+    item_changed(item_name)
 
-    s3_client.delete_object(
-        Bucket=settings.AWS_IMAGE_BUCKET_NAME, Key=f"{item_name}.jpg"
-    )
+    release_item_images(item_name, item_image, session)
 
     logger.info(
         f"Item [{item_name}] deleted by admin [{user.first_name} {user.last_name}]"
     )
 
     return {"detail": "Successfully deleted item"}
+
+
+@item_router.get("/image-job", response_model=ImageJobExport)
+def get_image_job(job_id: str, user: UserInternal = Depends(is_admin)):
+    """Status of an image processing job started by creating or updating an item."""
+    job = image_jobs.get(job_id)
+    if not job:
+        raise image_job_not_found_exception
+    return job
+
+
+@item_router.post("/import")
+def import_auction_items(
+    manifest: UploadFile = File(...),
+    images: UploadFile = File(...),
+    user: UserInternal = Depends(is_admin),
+):
+    """
+    Creates many items at once from a CSV or JSON manifest and a ZIP archive of their
+    images. Streams back one JSON line per manifest row with its result.
+    """
+    try:
+        manifest_rows = parse_manifest(manifest.filename, manifest.file.read())
+    except (ManifestError, ValueError):
+        raise import_manifest_invalid_exception
+
+    # Keep our own copy of the archive, since the upload is closed once this handler
+    # returns but the import continues while the response streams.
+    archive = tempfile.TemporaryFile()
+    shutil.copyfileobj(images.file, archive)
+    if not zipfile.is_zipfile(archive):
+        archive.close()
+        raise import_archive_invalid_exception
+    archive.seek(0)
+
+    logger.info(
+        f"Import of [{len(manifest_rows)}] items started by admin [{user.first_name} {user.last_name}]"
+    )
+    return StreamingResponse(
+        import_items(manifest_rows, archive), media_type="application/x-ndjson"
+    )
@@ -0,0 +1,137 @@
+"""
+In-process fan-out of live auction updates to Server-Sent Events clients.
+
+Committed bids and bidding-enabled changes reach every worker through the
+notification listener and are fanned out to that worker's connected clients.
+Each connection only buffers the latest update per item, so a slow client is
+sent the current state rather than a backlog; a client that falls further
+behind than STREAM_MAX_PENDING distinct updates is disconnected and is expected
+to reconnect and re-fetch.
+"""
+
+import asyncio
+import json
+from collections import OrderedDict
+from typing import Iterable, List, Optional, Set
+
+from src.bidding import BID_CHANNEL
+from src.feature_flags import FEATURE_FLAG_CHANNEL, feature_flags
+from src.notifications import listener
+from src.settings import settings
+
+BIDDING_ENABLED_KEY = "bidding_enabled"
+
+
+def format_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class Subscription:
+    def __init__(self, item_names: Optional[Iterable[str]], max_pending: int):
+        self.item_names: Optional[Set[str]] = set(item_names) if item_names else None
+        self.overflowed = False
+        self._max_pending = max_pending
+        self._pending: "OrderedDict[str, str]" = OrderedDict()
+        self._ready = asyncio.Event()
+
+    def wants(self, item_name: Optional[str]) -> bool:
+        return item_name is None or self.item_names is None or item_name in self.item_names
+
+    def offer(self, key: str, message: str) -> None:
+        # Replace any undelivered update for the same key with the newer one.
+        self._pending.pop(key, None)
+        self._pending[key] = message
+        if len(self._pending) > self._max_pending:
+            self.overflowed = True
+        self._ready.set()
+
+    async def next_batch(self, timeout: float) -> List[str]:
+        """Waits up to timeout seconds for updates and returns all pending ones."""
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return []
+        self._ready.clear()
+        batch = list(self._pending.values())
+        self._pending.clear()
+        return batch
+
+
+class BidStreamHub:
+    def __init__(self):
+        self._subscriptions: Set[Subscription] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def subscribe(self, item_names: Optional[Iterable[str]] = None) -> Subscription:
+        self._loop = asyncio.get_running_loop()
+        subscription = Subscription(item_names, settings.STREAM_MAX_PENDING)
+        self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        self._subscriptions.discard(subscription)
+
+    def __len__(self) -> int:
+        return len(self._subscriptions)
+
+    def publish_bid(self, item_name: str, amount: float) -> None:
+        message = format_event("bid", {"item_name": item_name, "winning_bid": amount})
+        self._broadcast(f"bid:{item_name}", message, item_name)
+
+    def publish_bidding_enabled(self, enabled: bool) -> None:
+        message = format_event(BIDDING_ENABLED_KEY, {"bidding_enabled": enabled})
+        self._broadcast(BIDDING_ENABLED_KEY, message)
+
+    def _broadcast(self, key: str, message: str, item_name: str = None) -> None:
+        if self._loop is None:
+            return  # Nobody has subscribed on this worker yet.
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+
+        # Subscriptions belong to the event loop; hop onto it when publishing from a
+        # threadpool endpoint.
+        if running_loop is self._loop:
+            self._deliver(key, message, item_name)
+        else:
+            self._loop.call_soon_threadsafe(self._deliver, key, message, item_name)
+
+    def _deliver(self, key: str, message: str, item_name: Optional[str]) -> None:
+        for subscription in list(self._subscriptions):
+            if subscription.wants(item_name):
+                subscription.offer(key, message)
+
+    async def events(self, request, item_names: Optional[Iterable[str]] = None):
+        """Subscribes and yields SSE messages until the client disconnects."""
+        subscription = self.subscribe(item_names)
+        try:
+            yield format_event(
+                BIDDING_ENABLED_KEY,
+                {"bidding_enabled": feature_flags.get("enable_bidding")},
+            )
+            while not subscription.overflowed:
+                batch = await subscription.next_batch(settings.STREAM_KEEPALIVE_INTERVAL)
+                if await request.is_disconnected():
+                    break
+                yield "".join(batch) if batch else ": keepalive\n\n"
+        finally:
+            self.unsubscribe(subscription)
+
+
+bid_stream = BidStreamHub()
+
+
+def _on_bid(payload: str) -> None:
+    change = json.loads(payload)
+    bid_stream.publish_bid(change["item_name"], change["bid"])
+
+
+def _on_feature_flag(payload: str) -> None:
+    change = json.loads(payload)
+    if change["flag"] == "enable_bidding":
+        bid_stream.publish_bidding_enabled(change["value"])
+
+
+listener.subscribe(BID_CHANNEL, _on_bid)
+listener.subscribe(FEATURE_FLAG_CHANNEL, _on_feature_flag)
@@ -0,0 +1,106 @@
+"""
+Token revocation for access tokens.
+
+Every user has a token_version, embedded in the tokens issued to them as the
+`tv` claim. Bumping it revokes all of their earlier tokens. Each worker keeps
+the versions of users that have ever been revoked in memory (normally a handful
+of rows), updated over NOTIFY when a revocation commits and reloaded every
+AUTH_TOKEN_VERSION_REFRESH_INTERVAL seconds, so checking a token never touches
+the database.
+"""
+
+import asyncio
+import json
+import logging
+from typing import Dict
+
+from sqlalchemy import update
+from sqlmodel import select
+
+from src.database import get_async_session
+from src.models import UserInternal
+from src.notifications import listener, notify_clause
+from src.settings import settings
+
+logger = logging.getLogger("api")
+
+TOKEN_VERSION_CHANNEL = "token_versions"
+
+
+class TokenVersions:
+    def __init__(self):
+        self._versions: Dict[str, int] = {}
+        self._task = None
+
+    def version(self, email: str) -> int:
+        return self._versions.get(email, 0)
+
+    def is_revoked(self, email: str, token_version: int) -> bool:
+        return token_version < self.version(email)
+
+    def apply(self, email: str, token_version: int) -> None:
+        versions = dict(self._versions)
+        versions[email] = max(token_version, versions.get(email, 0))
+        self._versions = versions
+
+    async def refresh(self) -> None:
+        session = get_async_session()
+        try:
+            result = await session.execute(
+                select(UserInternal.email, UserInternal.token_version).where(
+                    UserInternal.token_version > 0
+                )
+            )
+            self._versions = dict(result.all())
+        finally:
+            await session.close()
+
+    async def start(self) -> None:
+        await self.refresh()
+        self._task = asyncio.create_task(self._poll())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _poll(self):
+        while True:
+            await asyncio.sleep(settings.AUTH_TOKEN_VERSION_REFRESH_INTERVAL)
+            try:
+                await self.refresh()
+            except Exception as err:
+                logger.warning(f"Unable to refresh token versions: {err}")
+
+
+token_versions = TokenVersions()
+
+
+def _on_token_version(payload: str) -> None:
+    change = json.loads(payload)
+    token_versions.apply(change["email"], change["token_version"])
+
+
+listener.subscribe(TOKEN_VERSION_CHANNEL, _on_token_version)
+
+
+async def revoke_user_tokens(email: str, session) -> bool:
+    """
+    Invalidates every token issued to email so far. Returns False if there is no such
+    user.
+    """
+    result = await session.execute(
+        update(UserInternal)
+        .where(UserInternal.email == email)
+        .values(token_version=UserInternal.token_version + 1)
+        .returning(UserInternal.token_version)
+    )
+    token_version = result.scalar()
+    if token_version is None:
+        return False
+
+    payload = json.dumps({"email": email, "token_version": token_version})
+    await session.execute(notify_clause(TOKEN_VERSION_CHANNEL, payload))
+    await session.commit()
+    listener.publish_local(TOKEN_VERSION_CHANNEL, payload)
+    return True
@@ -0,0 +1,75 @@
+import uuid
+from unittest.mock import MagicMock
+
+import pytest
+
+
+@pytest.fixture
+def fresh_analytics():
+    """Reads past the analytics cache, so responses reflect the latest bids."""
+    from src.analytics import analytics_cache
+
+    analytics_cache.clear()
+    yield analytics_cache.clear
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    """Stands in for S3, which deleting an item cleans up."""
+    client = MagicMock()
+    monkeypatch.setattr("src.images.get_s3_client", lambda: client)
+    return client
+
+
+def test_analytics_include_bids(
+    client, add_items, register, bidding_enabled, fresh_analytics
+):
+    admin = register(admin=True)
+    name = f"Contested lot {uuid.uuid4().hex[:8]}"
+    add_items({"name": name, "original_bid": 10.0})
+    before = client.get("/bids/analytics", headers=admin).json()
+
+    bidders = [register(), register()]
+    for amount, bidder in zip((10.0, 20.0, 30.0), bidders * 2):
+        response = client.post(
+            "/bids/bid", json={"item_name": name, "bid": amount}, headers=bidder
+        )
+        assert response.status_code == 200, response.text
+
+    fresh_analytics()
+    response = client.get("/bids/analytics", params={"top": 100}, headers=admin)
+    assert response.status_code == 200, response.text
+    after = response.json()
+    assert after["total_bids"] == before["total_bids"] + 3
+    assert after["total_raised"] == pytest.approx(before["total_raised"] + 30.0)
+    assert after["unique_bidders"] == before["unique_bidders"] + 2
+    assert sum(minute["bids"] for minute in after["bids_per_minute"]) >= 3
+    assert {
+        "item_name": name,
+        "bids": 3,
+        "unique_bidders": 2,
+        "winning_bid": 30.0,
+    } in after["most_contested"]
+
+
+def test_deleted_item_leaves_analytics(
+    client, add_items, register, bidding_enabled, fresh_analytics, s3
+):
+    admin = register(admin=True)
+    name = f"Withdrawn lot {uuid.uuid4().hex[:8]}"
+    add_items({"name": name, "original_bid": 10.0})
+    response = client.post(
+        "/bids/bid", json={"item_name": name, "bid": 15.0}, headers=register()
+    )
+    assert response.status_code == 200, response.text
+    fresh_analytics()
+    before = client.get("/bids/analytics", params={"top": 100}, headers=admin).json()
+
+    response = client.delete("/items/item", params={"item_name": name}, headers=admin)
+    assert response.status_code == 200, response.text
+
+    fresh_analytics()
+    after = client.get("/bids/analytics", params={"top": 100}, headers=admin).json()
+    assert name not in [item["item_name"] for item in after["most_contested"]]
+    assert after["total_bids"] == before["total_bids"] - 1
+    assert after["total_raised"] == pytest.approx(before["total_raised"] - 15.0)
@@ -0,0 +1,21 @@
+import uuid
+
+from sqlalchemy import update
+
+from src.database import get_engine
+from src.models import UserInternal
+from src.routers.auth_router import invalidate_user
+
+
+def test_disabled_user_is_rejected(client, register):
+    email = f"{uuid.uuid4().hex[:12]}@example.com"
+    headers = register(email)
+    assert client.get("/auth/profile", headers=headers).status_code == 200
+
+    with get_engine().begin() as connection:
+        connection.execute(
+            update(UserInternal).where(UserInternal.email == email).values(enabled=False)
+        )
+    invalidate_user(email)
+
+    assert client.get("/auth/profile", headers=headers).status_code == 401
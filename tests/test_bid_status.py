@@ -0,0 +1,73 @@
+from src.bid_status import BidStatusCache
+from src.settings import settings
+
+
+def test_watchers_stay_bounded_as_users_come_and_go(monkeypatch):
+    monkeypatch.setattr(settings, "BID_STATUS_CACHE_SIZE", 10)
+    cache = BidStatusCache()
+
+    for user in range(1000):
+        email = f"user-{user}@example.com"
+        cache.set(email, b"{}", [f"Item {user}", "Popular item"], cache.generation)
+
+    watchers = sum(len(emails) for emails in cache._watchers.values())
+    assert watchers <= 4 * settings.BID_STATUS_CACHE_SIZE + 2
+    assert len(cache._watchers) <= 2 * settings.BID_STATUS_CACHE_SIZE + 1
+
+    # Users still cached are still invalidated by a bid on their items.
+    cache.invalidate_item("Item 999")
+    assert cache.get("user-999@example.com") is None
+    assert cache.get("user-998@example.com") == b"{}"
+    cache.invalidate_item("Popular item")
+    assert cache.get("user-998@example.com") is None
+
+
+def test_watchers_of_expired_statuses_are_pruned(monkeypatch):
+    monkeypatch.setattr(settings, "BID_STATUS_CACHE_SIZE", 10)
+    monkeypatch.setattr(settings, "BID_STATUS_CACHE_TTL", -1)  # Expired as soon as set
+    cache = BidStatusCache()
+
+    for user in range(100):
+        cache.set(f"user-{user}@example.com", b"{}", [f"Item {user}"], cache.generation)
+
+    assert len(cache._watchers) <= settings.BID_STATUS_CACHE_SIZE + 1
+
+
+def test_only_invalidations_of_covered_items_discard_a_result():
+    cache = BidStatusCache()
+
+    generation = cache.generation
+    cache.invalidate_item("Other item")
+    cache.invalidate_user("other@example.com")
+    cache.set("user@example.com", b"{}", ["Item"], generation)
+    assert cache.get("user@example.com") == b"{}"
+
+    generation = cache.generation
+    cache.invalidate_item("Item")
+    cache.set("user@example.com", b"{}", ["Item"], generation)
+    assert cache.get("user@example.com") is None
+
+    generation = cache.generation
+    cache.invalidate_user("user@example.com")
+    cache.set("user@example.com", b"{}", ["Item"], generation)
+    assert cache.get("user@example.com") is None
+
+    generation = cache.generation
+    cache.clear()
+    cache.set("user@example.com", b"{}", ["Item"], generation)
+    assert cache.get("user@example.com") is None
+
+
+def test_invalidation_generations_stay_bounded(monkeypatch):
+    monkeypatch.setattr(settings, "BID_STATUS_CACHE_SIZE", 10)
+    cache = BidStatusCache()
+
+    generation = cache.generation
+    cache.invalidate_user("user@example.com")
+    for user in range(1000):
+        cache.invalidate_user(f"user-{user}@example.com")
+
+    assert len(cache._user_generations) <= settings.BID_STATUS_CACHE_SIZE
+    # The user's generation was dropped, but the result is still discarded.
+    cache.set("user@example.com", b"{}", ["Item"], generation)
+    assert cache.get("user@example.com") is None
@@ -0,0 +1,44 @@
+import uuid
+
+
+def test_gzip_and_identity_bodies_have_distinct_etags(client, add_items):
+    add_items({"name": f"Catalog lot {uuid.uuid4().hex[:8]}"})
+
+    identity = client.get("/items/items", headers={"Accept-Encoding": "identity"})
+    gzipped = client.get("/items/items", headers={"Accept-Encoding": "gzip"})
+
+    assert identity.status_code == gzipped.status_code == 200
+    assert "Content-Encoding" not in identity.headers
+    assert gzipped.headers["Content-Encoding"] == "gzip"
+    assert identity.json() == gzipped.json()
+    assert gzipped.headers["ETag"] != identity.headers["ETag"]
+    assert gzipped.headers["Vary"] == identity.headers["Vary"] == "Accept-Encoding"
+
+
+def test_etag_revalidates_only_its_own_encoding(client, add_items):
+    add_items({"name": f"Catalog lot {uuid.uuid4().hex[:8]}"})
+    etags = {
+        encoding: client.get("/items/items", headers={"Accept-Encoding": encoding}).headers[
+            "ETag"
+        ]
+        for encoding in ("identity", "gzip")
+    }
+
+    for encoding, etag in etags.items():
+        response = client.get(
+            "/items/items", headers={"Accept-Encoding": encoding, "If-None-Match": etag}
+        )
+        assert response.status_code == 304
+        assert response.headers["ETag"] == etag
+
+    # A cached identity body must not be revalidated as the gzipped one, or vice versa.
+    response = client.get(
+        "/items/items",
+        headers={"Accept-Encoding": "gzip", "If-None-Match": etags["identity"]},
+    )
+    assert response.status_code == 200
+    response = client.get(
+        "/items/items",
+        headers={"Accept-Encoding": "identity", "If-None-Match": etags["gzip"]},
+    )
+    assert response.status_code == 200
@@ -0,0 +1,36 @@
+from collections import namedtuple
+
+from src.exports import _grouped_batches
+
+Row = namedtuple("Row", ["email", "first_name", "last_name", "item_name", "winning_bid"])
+
+
+def row(email: str, item_name: str, winning_bid: float) -> Row:
+    return Row(email, "First", "Last", item_name, winning_bid)
+
+
+def test_winners_spanning_batches_are_grouped_once():
+    batches = [
+        [row("a@example.com", "Lamp", 10.0), row("b@example.com", "Mug", 5.0)],
+        [row("b@example.com", "Rug", 20.0)],
+        [row("b@example.com", "Vase", 15.0), row("c@example.com", "Quilt", 30.0)],
+    ]
+
+    winners = [winner for chunk in _grouped_batches(batches) for winner in chunk]
+
+    assert [winner["email"] for winner in winners] == [
+        "a@example.com",
+        "b@example.com",
+        "c@example.com",
+    ]
+    assert winners[1]["items"] == [
+        {"item_name": "Mug", "winning_bid": 5.0},
+        {"item_name": "Rug", "winning_bid": 20.0},
+        {"item_name": "Vase", "winning_bid": 15.0},
+    ]
+    assert winners[1]["item_count"] == 3
+    assert winners[1]["total"] == 40.0
+
+
+def test_no_winners_yields_nothing():
+    assert list(_grouped_batches([])) == []
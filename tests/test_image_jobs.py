@@ -0,0 +1,151 @@
+import io
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock
+
+from botocore.exceptions import EndpointConnectionError
+from PIL import Image
+
+from src.database import get_session
+from src.images import (
+    IMAGE_JOB_FAILED,
+    IMAGE_JOB_PENDING,
+    IMAGE_JOB_PROCESSING,
+    ImageJobQueue,
+    render_image,
+)
+from src.models import ImageJob
+from src.settings import settings
+
+
+def wait_for_job(client, headers, job_id: str, timeout: float = 60) -> dict:
+    deadline = time.monotonic() + timeout
+    while True:
+        response = client.get("/items/image-job", params={"job_id": job_id}, headers=headers)
+        assert response.status_code == 200, response.text
+        job = response.json()
+        if job["status"] not in (IMAGE_JOB_PENDING, IMAGE_JOB_PROCESSING):
+            return job
+        assert time.monotonic() < deadline, job
+        time.sleep(0.1)
+
+
+def insert_job(status: str, updated_at: datetime, worker: str = "gone") -> str:
+    job_id = str(uuid.uuid4())
+    session = get_session()
+    try:
+        session.add(
+            ImageJob(
+                id=job_id,
+                item_name="Some item",
+                status=status,
+                worker=worker,
+                updated_at=updated_at,
+            )
+        )
+        session.commit()
+    finally:
+        session.close()
+    return job_id
+
+
+def test_failed_job_is_reported_by_any_worker(client, register):
+    admin = register(admin=True)
+    name = f"Broken image {uuid.uuid4().hex[:8]}"
+    response = client.post(
+        "/items/item",
+        data={"name": name, "description": "Unreadable", "bid": "10", "tags": ["art"]},
+        files={"image": ("image.png", b"not an image", "image/png")},
+        headers=admin,
+    )
+    assert response.status_code == 200, response.text
+    job_id = response.json()["image_job"]["id"]
+
+    job = wait_for_job(client, admin, job_id)
+    assert job["status"] == IMAGE_JOB_FAILED
+    assert job["error"]
+
+    # A queue that never saw the job, like another worker's, reads the same status.
+    other_worker = ImageJobQueue().get(job_id)
+    assert other_worker.status == IMAGE_JOB_FAILED
+    assert other_worker.error == job["error"]
+
+
+def test_stalled_job_is_reported_as_failed(database):
+    stalled = insert_job(
+        IMAGE_JOB_PROCESSING, datetime.now(timezone.utc) - timedelta(hours=1)
+    )
+    running = insert_job(IMAGE_JOB_PROCESSING, datetime.now(timezone.utc))
+
+    queue = ImageJobQueue()
+    assert queue.get(stalled).status == IMAGE_JOB_FAILED
+    assert queue.get(running).status == IMAGE_JOB_PROCESSING
+
+
+def test_unknown_job_is_not_found(client, register):
+    response = client.get(
+        "/items/image-job", params={"job_id": str(uuid.uuid4())}, headers=register(admin=True)
+    )
+    assert response.status_code == 404
+
+
+def test_item_deletion_survives_s3_errors(client, add_items, register, monkeypatch):
+    admin = register(admin=True)
+    name = f"Withdrawn lot {uuid.uuid4().hex[:8]}"
+    add_items({"name": name, "original_bid": 10.0})
+    s3 = MagicMock()
+    s3.delete_objects.side_effect = EndpointConnectionError(endpoint_url="https://s3")
+    monkeypatch.setattr("src.images.get_s3_client", lambda: s3)
+
+    response = client.delete("/items/item", params={"item_name": name}, headers=admin)
+
+    assert response.status_code == 200, response.text
+    assert s3.delete_objects.called
+    response = client.get("/items/item", params={"item_name": name}, headers=admin)
+    assert response.status_code == 404
+
+
+def test_render_image_variants():
+    source = io.BytesIO()
+    Image.new("RGBA", (1200, 600), (200, 40, 40, 255)).save(source, format="PNG")
+
+    variants, placeholder = render_image(source.getvalue())
+
+    assert placeholder
+    assert len(variants) == len(settings.IMAGE_VARIANT_SIZES) * 2
+    for size, image_format, width, height, body in variants:
+        assert (width, height) == (size, size // 2)
+        assert Image.open(io.BytesIO(body)).format == image_format
+
+
+def test_render_image_does_not_upscale():
+    source = io.BytesIO()
+    Image.new("RGB", (300, 150), (40, 40, 200)).save(source, format="PNG")
+
+    variants, _ = render_image(source.getvalue())
+
+    sizes = sorted(settings.IMAGE_VARIANT_SIZES)
+    full_resolution = min(size for size in sizes if size >= 300)
+    expected = [size for size in sizes if size < 300] + [full_resolution]
+    assert sorted({size for size, *_ in variants}) == expected
+    for size, _, width, height, _ in variants:
+        if size == full_resolution:
+            assert (width, height) == (300, 150)
+
+
+def test_render_pool_is_rebuilt_after_a_worker_dies():
+    source = io.BytesIO()
+    Image.new("RGB", (300, 200), (40, 200, 40)).save(source, format="PNG")
+    queue = ImageJobQueue()
+    try:
+        queue._render(source.getvalue())
+        broken = queue._render_pool()
+        next(iter(broken._processes.values())).kill()
+
+        variants, placeholder = queue._render(source.getvalue())
+
+        assert variants and placeholder
+        assert queue._render_pool() is not broken
+    finally:
+        queue.shutdown()
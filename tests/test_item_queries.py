@@ -0,0 +1,75 @@
+"""
+Item listings load every item with its winning bid in one projection query, so the
+number of queries a request makes must not grow with the number of items.
+"""
+
+import uuid
+
+import pytest
+
+from src.catalog import item_changed
+
+
+def query_count(response) -> int:
+    assert response.status_code == 200, response.text
+    return int(response.headers["X-DB-Query-Count"])
+
+
+def add_tagged_items(add_items, count: int):
+    tag = uuid.uuid4().hex[:8]
+    names = [f"Lot {tag} {index:02d}" for index in range(count)]
+    add_items(*({"name": name, "tags": [tag]} for name in names))
+    return tag, names
+
+
+@pytest.mark.parametrize("params", [{}, {"limit": 500}], ids=["snapshot", "page"])
+def test_item_listing_query_count_is_constant(client, add_items, params):
+    counts = []
+    for count in (2, 20):
+        add_tagged_items(add_items, count)
+        # Make the snapshot rebuild so its query is counted.
+        item_changed("*")
+        response = client.get("/items/items", params=params)
+        assert len(response.json()["items"]) >= count
+        counts.append(query_count(response))
+
+    assert counts[0] == counts[1] > 0
+
+
+def test_tag_filtered_page_query_count_is_constant(client, add_items):
+    counts = []
+    for count in (2, 20):
+        tag, names = add_tagged_items(add_items, count)
+        response = client.get("/items/items", params={"tags_any": [tag]})
+        assert [item["name"] for item in response.json()["items"]] == names
+        counts.append(query_count(response))
+
+    assert counts[0] == counts[1] > 0
+
+
+def test_user_bid_status_query_count_is_constant(
+    client, add_items, register, bidding_enabled
+):
+    counts = []
+    for count in (2, 20):
+        bidder, rival = register(), register()
+        _, names = add_tagged_items(add_items, count)
+        for index, name in enumerate(names):
+            response = client.post(
+                "/bids/bid", json={"item_name": name, "bid": 10.0}, headers=bidder
+            )
+            assert response.status_code == 200, response.text
+            if index % 2:
+                response = client.post(
+                    "/bids/bid", json={"item_name": name, "bid": 100.0}, headers=rival
+                )
+                assert response.status_code == 200, response.text
+
+        response = client.get("/bids/user", headers=bidder)
+        status = response.json()
+        assert len(status["winning_bids"]) == count // 2
+        assert len(status["losing_bids"]) == count // 2
+        assert all(item["winning_bid"]["bid"] == 100.0 for item in status["losing_bids"])
+        counts.append(query_count(response))
+
+    assert counts[0] == counts[1] > 0
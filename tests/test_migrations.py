@@ -0,0 +1,124 @@
+"""
+Every change to an existing table has to ship with a migration: create_all only
+creates missing tables, so a column or index added to a model without one never
+reaches a deployed database. These tests start from the schema the first release
+created, upgrade it the way create_db does, and expect the result to match the
+models.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.engine import make_url
+from sqlalchemy_utils import create_database, database_exists, drop_database
+from sqlmodel import SQLModel
+
+# The tables as the first release created them, before any migration.
+BASELINE_SCHEMA = [
+    """
+    CREATE TABLE bids (
+        id VARCHAR NOT NULL PRIMARY KEY,
+        bid FLOAT,
+        email VARCHAR,
+        time_placed VARCHAR,
+        item_name VARCHAR
+    )
+    """,
+    "CREATE INDEX ix_bids_email ON bids (email)",
+    """
+    CREATE TABLE feature_flags (
+        flag VARCHAR NOT NULL PRIMARY KEY,
+        value BOOLEAN NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE users (
+        email VARCHAR NOT NULL PRIMARY KEY,
+        first_name VARCHAR,
+        last_name VARCHAR,
+        hashed_password VARCHAR,
+        enabled BOOLEAN NOT NULL,
+        admin BOOLEAN NOT NULL
+    )
+    """,
+    "CREATE INDEX ix_users_last_name ON users (last_name)",
+    "CREATE INDEX ix_users_first_name ON users (first_name)",
+    "CREATE INDEX ix_users_email ON users (email)",
+    """
+    CREATE TABLE items (
+        tags VARCHAR[],
+        name VARCHAR NOT NULL PRIMARY KEY,
+        description VARCHAR,
+        original_bid FLOAT,
+        image VARCHAR,
+        image_placeholder VARCHAR,
+        winning_bid_id VARCHAR REFERENCES bids (id)
+    )
+    """,
+]
+
+
+@pytest.fixture
+def baseline_engine(database):
+    from src.database import database_url
+
+    url = make_url(database_url())
+    url = url.set(database=f"{url.database[: -len('_test')]}_baseline_test")
+    if database_exists(url):
+        drop_database(url)
+    create_database(url)
+    engine = create_engine(url)
+    with engine.begin() as connection:
+        for statement in BASELINE_SCHEMA:
+            connection.execute(text(statement))
+    yield engine
+    engine.dispose()
+    drop_database(url)
+
+
+def upgrade(engine) -> int:
+    """What create_db does to an existing database."""
+    import src.models  # noqa
+    from src.migrations import migrate
+
+    SQLModel.metadata.create_all(engine)
+    return migrate(engine)
+
+
+def test_migrations_bring_the_baseline_schema_up_to_the_models(baseline_engine):
+    from src.migrations import LATEST_VERSION
+
+    assert upgrade(baseline_engine) == LATEST_VERSION
+
+    inspector = inspect(baseline_engine)
+    for table in SQLModel.metadata.sorted_tables:
+        columns = {column["name"] for column in inspector.get_columns(table.name)}
+        assert columns == set(table.columns.keys()), table.name
+        indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+        assert {index.name for index in table.indexes} <= indexes, table.name
+
+
+def test_migrations_can_be_reapplied(baseline_engine):
+    from src.migrations import LATEST_VERSION, _set_schema_version
+
+    upgrade(baseline_engine)
+    with baseline_engine.begin() as connection:
+        _set_schema_version(connection, 0)
+
+    assert upgrade(baseline_engine) == LATEST_VERSION
+
+
+def test_concurrent_migrations_apply_each_migration_once(baseline_engine, caplog):
+    import src.models  # noqa
+    from src.migrations import LATEST_VERSION, MIGRATIONS, migrate
+
+    SQLModel.metadata.create_all(baseline_engine)
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        versions = list(pool.map(lambda _: migrate(baseline_engine), range(4)))
+
+    assert versions == [LATEST_VERSION] * 4
+    applied = [
+        record for record in caplog.records if "Applying schema migration" in record.getMessage()
+    ]
+    assert len(applied) == len(MIGRATIONS)
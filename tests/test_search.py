@@ -0,0 +1,34 @@
+import uuid
+
+
+def test_search_ranks_matches_by_prefix(client, add_items):
+    run = uuid.uuid4().hex[:8]
+    add_items(
+        {"name": f"Signed baseball {run}", "description": "Signed by the team", "tags": ["sports"]},
+        {"name": f"Watercolor {run}", "description": "A painting of a baseball field"},
+        {"name": f"Dinner for two {run}", "description": "At a local restaurant", "tags": ["dining"]},
+    )
+
+    response = client.get("/items/search", params={"q": f"basebal {run}"})
+
+    assert response.status_code == 200, response.text
+    names = [item["name"] for item in response.json()["items"]]
+    # Name matches outrank description matches.
+    assert names == [f"Signed baseball {run}", f"Watercolor {run}"]
+
+
+def test_search_matches_tags(client, add_items):
+    run = uuid.uuid4().hex[:8]
+    add_items({"name": f"Tasting menu {run}", "tags": ["dining"]})
+
+    response = client.get("/items/search", params={"q": f"dining {run}"})
+
+    assert response.status_code == 200, response.text
+    assert [item["name"] for item in response.json()["items"]] == [f"Tasting menu {run}"]
+
+
+def test_search_without_words_returns_nothing(client):
+    response = client.get("/items/search", params={"q": "!?"})
+
+    assert response.status_code == 200, response.text
+    assert response.json()["items"] == []